@@ -7,22 +7,30 @@ import requests
 from websocket import create_connection
 import aiohttp
 import asyncio
-from queue import Queue
 import time
+from frameBuffers import LatestFrameSlot, FrameChannel
+from videoSource import CaptureThread, open_capture
+from processWorker import CameraWorker
+from sharedFrames import release_frame
+from samplingPolicy import make_sampling_policy
+from motionDetector import make_motion_detector
+from eventStore import RecentEvents
+from displayStream import FrameEncoder, MjpegServer
 
 class WindowStreamer:
-    def __init__(self, cam_name, cam_details):
+    def __init__(self, cam_name, cam_details, scheduler=None, runtime='thread'):
         self.cam_name = cam_name
         self.cam_details = cam_details
+        self.scheduler = scheduler  # batches detector calls across cameras, None runs them on this camera's thread
+        self.runtime = runtime  # 'process' runs capture and the models in a CameraWorker process
         self.connections = {}  # To manage multiple sources and their states
         self.streaming_windows = {}
         self.task = cam_details['task']
         self.type = cam_details['type']
 
-        # Initialize the model based on cam_details
-        self.model = self.initialize_model()
+        # Initialize the model based on cam_details, a worker process loads its own
+        self.model = self.initialize_model() if runtime != 'process' else None
         self.data_tables = {}
-        self._create_table() # create a table in db
 
         self.websocket = None
         self.ptz_active = {
@@ -86,64 +94,34 @@ class WindowStreamer:
             self.data_tables[source_id]=data_table
             return data_table
     
-    # _create_table function is used to create actual table as per selected task in the database to store data.
-    def _create_table(self):
-        """Create database table for the camera"""
-        with sqlite3.connect('records.db') as conn:
-            cursor = conn.cursor()
-
-            if self.cam_details['task'] == 'Anpr':
-                cursor.execute(f"""
-                CREATE TABLE IF NOT EXISTS {self.cam_name} (
-                    Time TEXT,
-                    Type TEXT,
-                    LicenseNumber TEXT 
-                )
-                """)
-
-                # can add ID TEXT
-                cursor.execute(f"DELETE FROM {self.cam_name}")
-            else:
-                cursor.execute(f"""
-                CREATE TABLE IF NOT EXISTS {self.cam_name} (
-                    Time TEXT,
-                    Type TEXT
-                )
-                """)
-                cursor.execute(f"DELETE FROM {self.cam_name}")
-            conn.commit()
-    
     # _fetch_latest_records function is used to fetch latest 3 records from the table of specific cam.
     def _fetch_latest_records(self):
         """Fetch the latest 3 records from the database"""
         with sqlite3.connect('records.db') as conn:
             cursor = conn.cursor()
-            cursor.execute(f"""
-                SELECT * 
-                FROM {self.cam_name} 
-                ORDER BY ROWID DESC 
+            cursor.execute("""
+                SELECT ts, class, plate
+                FROM events
+                WHERE camera = ?
+                ORDER BY ts DESC 
                 LIMIT 3
-            """)
+            """, (self.cam_name,))
             return cursor.fetchall()
 
     # _update_table function is used to update the table with latest records.  
-    def _update_table(self,source_id):
-        """Update the table with latest records"""
-        records = self._fetch_latest_records()
-        while len(records)<5:
-            records.append(("--","--","--") if self.task=='Anpr' else ("--","--"))
-
+    def _update_table(self,source_id, records):
+        """Update the table with the latest (ts, class, plate) records"""
         table=self.data_tables[source_id]
-        for i, record in enumerate(records[:3]):
-            if self.task=='Anpr':
-                table.rows[i].cells[0].content.value=str(record[0]) #Time
-                table.rows[i].cells[1].content.value=record[1] 
-                table.rows[i].cells[2].content.value=record[2] #Type
-                # table.rows[i].cells[3].content.value=record[3] #License NUmber
+        for i, row in enumerate(table.rows):
+            if i < len(records):
+                ts, object_type, plate = records[i]
+                detection_time = time.strftime('%H:%M:%S', time.localtime(ts))
             else:
-                table.rows[i].cells[0].content.value=str(record[0]) #Time
-                table.rows[i].cells[1].content.value=record[1] 
-                # table.rows[i].cells[2].content.value=record[2] #Type
+                detection_time, object_type, plate = "--", "--", "--"
+            row.cells[0].content.value=detection_time #Time
+            row.cells[1].content.value=object_type #Type
+            if self.task=='Anpr':
+                row.cells[2].content.value=plate #License NUmber
         #Refresh table to apply changes
         table.update()
 
@@ -154,9 +132,22 @@ class WindowStreamer:
         """Initialize the ML model based on camera details."""
         model_used = self.cam_details.get('model_used', '')
         if model_used == 'ANPRModel':
-            return ANPRModel()
+            return ANPRModel(plate_batch_size=self.cam_details.get('plate_batch_size', 16),
+                             plate_imgsz=self.cam_details.get('plate_imgsz', 640),
+                             ocr_batch_size=self.cam_details.get('ocr_batch_size', 16),
+                             ocr_stable_frames=self.cam_details.get('ocr_stable_frames', 3),
+                             roi=self.cam_details.get('roi'),
+                             trigger_line=self.cam_details.get('trigger_line'),
+                             conf=self.cam_details.get('conf'),
+                             iou=self.cam_details.get('iou'),
+                             inference_width=self.cam_details.get('inference_width'),
+                             plate_quality=self.cam_details.get('plate_quality'))
         elif model_used == 'YOLOv11DetectionModel':
-            return YOLOv11DetectionModel()
+            return YOLOv11DetectionModel(roi=self.cam_details.get('roi'),
+                                         classes=self.cam_details.get('classes'),
+                                         conf=self.cam_details.get('conf'),
+                                         iou=self.cam_details.get('iou'),
+                                         inference_width=self.cam_details.get('inference_width'))
         elif model_used == 'YOLOv11SegmentationModel':
             return YOLOv11SegmentationModel()
         else:
@@ -265,7 +256,8 @@ class WindowStreamer:
         if source_id not in self.connections:
             self.connections[source_id] = {
                 "is_connected": False,
-                "cap": None
+                "cap": None,
+                "stop_event": threading.Event()
             }
 
         connection = self.connections[source_id]
@@ -289,11 +281,21 @@ class WindowStreamer:
         connect_button.update()
 
         source = source_id  # Assign the source (e.g., 0 for webcam or file path)
-        cap = cv2.VideoCapture(source)
-
-        if not cap.isOpened():
-            print(f"Failed to open video source: {source}")
-            return
+        cap, sub_cap = None, None
+        if self.runtime != 'process':  # a worker process opens the source itself
+            capture_options = self.cam_details.get('capture', {})
+            cap = open_capture(source, capture_options)
+
+            if not cap.isOpened():
+                print(f"Failed to open video source: {source}")
+                return
+
+            # The detector runs on the low resolution substream when one is configured, plates are cropped from the main stream
+            if capture_options.get('substream'):
+                sub_cap = open_capture(capture_options['substream'], capture_options)
+                if not sub_cap.isOpened():
+                    print(f"Failed to open substream: {capture_options['substream']}, detecting on the main stream")
+                    sub_cap = None
 
         # Establish WebSocket connection if it's a PTZ camera
         if self.cam_details.get('type') in ['ptz', 'ptz_fixed']:
@@ -303,6 +305,14 @@ class WindowStreamer:
 
         # Store the video capture object in the connections dictionary
         self.connections[source_id]["cap"] = cap
+        self.connections[source_id]["sub_cap"] = sub_cap
+        self.connections[source_id]["stop_event"] = threading.Event()
+
+        if self.runtime == 'process':
+            # Capture, detection and OCR run in their own process, this one only shows the results
+            self.connections[source_id]["worker"] = CameraWorker(self.cam_name, self.cam_details, source).start()
+            threading.Thread(target=self.read_worker_frames, args=(source_id,), daemon=True).start()
+            return
 
         # Start a background thread to read frames
         threading.Thread(target=self.read_frames, args=(source_id,), daemon=True).start()
@@ -351,9 +361,11 @@ class WindowStreamer:
             asyncio.run(self.close_ptz_connection())
 
         connection = self.connections.get(source_id, None)
-        if connection and connection["cap"]:
-            connection["cap"].release()
+        if connection:
+            # The capture threads release their captures once they see the event, they may be inside cap.read()
+            connection["stop_event"].set()  # wake up and stop the reading and processing threads
             connection["cap"] = None
+            connection["sub_cap"] = None
 
         # Update streaming window to show disconnected state
         window = self.streaming_windows.get(source_id, None)
@@ -375,77 +387,196 @@ class WindowStreamer:
         cap = connection["cap"]
         #print(cap.get(cv2.CAP_PROP_FPS))
         window = self.streaming_windows[source_id]
-
-        process_queue = Queue(maxsize=10)  # Queue for frames to be processed
+        stop_event = connection["stop_event"]
+
+        process_slot = LatestFrameSlot()  # only the newest frame waits for processing
+        sampling_policy = make_sampling_policy(self.cam_details.get('sampling'))
+        motion_detector = make_motion_detector(self.cam_details.get('motion'))  # None runs inference on every sample
+        # Play video files at their own frame rate instead of as fast as they decode
+        source_fps = cap.get(cv2.CAP_PROP_FPS) if self.type == 'video' else 0
+        frame_period = 1.0 / source_fps if source_fps > 0 else 0
+        display_channel = FrameChannel()  # newest captured frame, read by the display loop at its own rate
         last_processed_result = {"frameDict":None} # Store the last processed result
-        frame_num = 0
-        table_update_queue=Queue()
+        # The table shows the in-memory latest events of the camera, the database is only read once to seed it
+        recent_events = RecentEvents.get(self.cam_name)
+        recent_events.seed(self._fetch_latest_records())
+        table_state = {"version": None, "next_time": 0.0}
+
+        # Frames are downscaled to the tile before drawing and encoding, at no more than max_fps
+        encoder, display_interval, mjpeg_server = self.setup_display(window)
+        next_display_time = time.monotonic()
 
         # Start a separate thread for processing frames
         processing_thread = threading.Thread(
             target=self.process_frames,
-            args=(process_queue, connection, self.model, self.cam_name, last_processed_result, table_update_queue),
+            args=(process_slot, stop_event, self.model, self.cam_name, last_processed_result,
+                  sampling_policy, motion_detector),
         )
         processing_thread.daemon = True
         processing_thread.start()
-        self._update_table(source_id)
-
-        while connection['is_connected']: 
-            ret, frame = cap.read()
-            if not ret:
-                print("Cannot connect to source!")
+        # Capture runs on its own thread so a slow display or inference never delays cap.read()
+        sub_cap = connection.get("sub_cap")
+        ring_slots = self.cam_details.get('capture', {}).get('ring_slots', 8)
+        if sub_cap is None:
+            CaptureThread(cap, stop_event, display_channel, process_slot, sampling_policy, frame_period,
+                          ring_slots=ring_slots).start()
+        else:
+            CaptureThread(cap, stop_event, display_channel, None, None, frame_period, ring_slots=ring_slots).start()
+            CaptureThread(sub_cap, stop_event, None, process_slot, sampling_policy, main_channel=display_channel).start()
+
+        sequence = 0
+        while not stop_event.is_set():
+            # Sleep until the next display slot, waking up at once on a disconnect
+            delay = next_display_time - time.monotonic()
+            if delay > 0 and stop_event.wait(delay):
                 break
-
-            frame_num += 1
-            frame_dict = {'frameNum': frame_num, 'frame': frame}
-
-            # Send alternate frames to the processing queue
-            if frame_num % 2 == 0 and not process_queue.full():
-                process_queue.put(frame_dict)
-
-            processed_frame_dict= last_processed_result.get("frameDict")
-            if processed_frame_dict is not None:
-                frame=self.model.plot_bounding_boxes(frame,processed_frame_dict,self.cam_name)
+            next_display_time = max(next_display_time + display_interval, time.monotonic())
 
             # Display the current frame
             try:
-                _, buffer = cv2.imencode(".jpg", frame)
-                img_str = base64.b64encode(buffer).decode("utf-8")
-                window.content.src_base64 = f"{img_str}"
-                window.update()
-
-                if not table_update_queue.empty():
-                    table_update_queue.get()
-                    self._update_table(source_id)
-
-                if self.type=='video' and self.task=='Anpr':  # to adjust fps for video and anpr 
-                    time.sleep(0.05)
+                newer = display_channel.wait_newer(sequence, timeout=0.5)
+                if newer is not None:
+                    sequence, frame_dict = newer
+                    image, scale = encoder.resize(frame_dict['frame'])  # overlays go on this small copy
+                    release_frame(frame_dict)
+                    processed_frame_dict= last_processed_result.get("frameDict")
+                    if processed_frame_dict is not None:
+                        image=self.model.plot_bounding_boxes(image,processed_frame_dict,self.cam_name,scale)
+                    self.show_image(window, encoder, mjpeg_server, image)
+
+                self.refresh_table(source_id, recent_events, table_state)
             except Exception as e:
                 print(f"Error displaying frame: {e}")
+                stop_event.set()
                 break
 
+    # READ WORKER FRAMES FUNCTION, shows the display frames a CameraWorker process shares with this one
+    def read_worker_frames(self, source_id):
+        connection = self.connections[source_id]
+        worker = connection["worker"]
+        window = self.streaming_windows[source_id]
+        stop_event = connection["stop_event"]
+
+        # The worker keeps the latest events and sends them over, only the empty table is seeded here
+        recent_events = RecentEvents.get(self.cam_name)
+        recent_events.seed(self._fetch_latest_records())
+        table_state = {"version": None, "next_time": 0.0}
+        encoder, display_interval, mjpeg_server = self.setup_display(window)
+        next_display_time = time.monotonic()
+        image = None  # reused for every frame copied out of the ring
+        sequence = 0
+
+        try:
+            while not stop_event.is_set() and not worker.stopped.is_set():
+                delay = next_display_time - time.monotonic()
+                if delay > 0 and stop_event.wait(delay):
+                    break
+                next_display_time = max(next_display_time + display_interval, time.monotonic())
+
+                # Frames already have the tile size and overlays, they only need encoding
+                newer = worker.read_frame(sequence, image)
+                if newer is not None:
+                    sequence, image = newer
+                    self.show_image(window, encoder, mjpeg_server, image)
+                self.refresh_table(source_id, recent_events, table_state)
+        except Exception as e:
+            print(f"Error displaying frame: {e}")
+        finally:
+            stop_event.set()
+            worker.stop()
+            if worker.ring is not None:
+                worker.ring.close()
+
+    # setup_display reads the display settings of the camera.
+    def setup_display(self, window):
+        """
+        Returns:
+            tuple: (FrameEncoder, seconds between displayed frames, MjpegServer or None)
+        """
+        display_config = self.cam_details.get('display', {})
+        encoder = FrameEncoder(display_config.get('width', 720), display_config.get('height', 480),
+                               display_config.get('jpeg_quality', 70))
+        mjpeg_server = None
+        # The desktop client loads network images with Flutter's NetworkImage, which waits for the end of the
+        # response and so never shows a multipart MJPEG stream. Only browsers render it.
+        if display_config.get('mjpeg_port') and not (window.page is not None and window.page.web):
+            print(f"Camera {self.cam_name}: mjpeg_port needs the Flet web view, showing frames over the websocket")
+        elif display_config.get('mjpeg_port'):
+            # The image streams from the MJPEG server instead of base64 updates over the Flet websocket
+            # mjpeg_bind is the listening address, mjpeg_host only the host name put into the stream URL
+            mjpeg_server = MjpegServer.get(display_config['mjpeg_port'], display_config.get('mjpeg_bind', '127.0.0.1'))
+            window.content.src = mjpeg_server.url(self.cam_name, display_config.get('mjpeg_host', 'localhost'))
+            window.update()
+        return encoder, 1.0 / display_config.get('max_fps', 15), mjpeg_server
+
+    # show_image encodes a display frame and hands it to the UI.
+    def show_image(self, window, encoder, mjpeg_server, image):
+        buffer = encoder.encode(image)
+        if buffer is None:
+            return
+        if mjpeg_server is not None:
+            mjpeg_server.publish(self.cam_name, buffer)
+        else:
+            img_str = base64.b64encode(buffer).decode("utf-8")
+            window.content.src_base64 = f"{img_str}"
+            window.update()
+
+    # refresh_table redraws the table only when an event was added, at most once per table_refresh_ms.
+    def refresh_table(self, source_id, recent_events, table_state):
+        if time.monotonic() < table_state["next_time"]:
+            return
+        version, records = recent_events.snapshot()
+        if version != table_state["version"]:
+            table_state["version"] = version
+            self._update_table(source_id, records)
+            table_state["next_time"] = time.monotonic() + self.cam_details.get('table_refresh_ms', 500) / 1000.0
+
 
     # Updated process_frames function
-    def process_frames(self, process_queue, connection, model, cam_name, last_processed_result, table_update_queue):
-        while connection['is_connected']:
-            if not process_queue.empty():
-                frame_dict = process_queue.get()
-                try:
-                    if self.cam_details['model_used'] == "ANPRModel":
-                        frame_dict1 = model.det_objects(frame_dict)
-                        frame_dict2 = model.det_plates_ocr(frame_dict1)
-                        last_processed_result["frameDict"] = frame_dict2  # Store processed result
-                    elif self.cam_details["model_used"] == "YOLOv11DetectionModel":
-                        frame_dict1 = model.predict(frame_dict)
-                        last_processed_result["frameDict"] = frame_dict1  # Store processed result
-                    else:
-                        last_processed_result["frameDict"] = None  # No result for unsupported models
-
-                    table_update_queue.put(True)
-                except Exception as e:
-                    print(f"Error processing frame: {e}")
+    def process_frames(self, process_slot, stop_event, model, cam_name, last_processed_result,
+                       sampling_policy, motion_detector=None):
+        last_processed_time = 0.0
+        while not stop_event.is_set():
+            # Block until a frame arrives, waking up regularly to notice a disconnect
+            frame_dict = process_slot.get(timeout=0.5)
+            if frame_dict is None:
+                continue
+            # Skip the detector and OCR on a static scene, the previous result is still valid. A frame is still
+            # processed every idle_interval, so tracks of vehicles that left age out and their boxes disappear.
+            start_time = time.monotonic()
+            if motion_detector is not None and not motion_detector.detect(frame_dict['frame']) \
+                    and last_processed_result["frameDict"] is not None \
+                    and start_time - last_processed_time < motion_detector.idle_interval:
+                release_frame(frame_dict)
+                continue
+            last_processed_time = start_time
+            try:
+                if self.cam_details['model_used'] == "ANPRModel":
+                    frame_dict1 = self.detect(model, frame_dict)
+                    frame_dict2 = model.det_plates_ocr(frame_dict1)
+                    model.record_detections(frame_dict2, cam_name)
+                    last_processed_result["frameDict"] = frame_dict2  # Store processed result
+                elif self.cam_details["model_used"] == "YOLOv11DetectionModel":
+                    frame_dict1 = self.detect(model, frame_dict)
+                    model.record_detections(frame_dict1, cam_name)
+                    last_processed_result["frameDict"] = frame_dict1  # Store processed result
+                else:
+                    last_processed_result["frameDict"] = None  # No result for unsupported models
+            except Exception as e:
+                print(f"Error processing frame: {e}")
+            finally:
+                release_frame(frame_dict)  # detection and OCR are done with the ring slot
+            sampling_policy.record_latency(time.monotonic() - start_time)
+
 
 
+    # detect runs the object detector and tracker, batched with the other cameras when a scheduler is set.
+    def detect(self, model, frame_dict):
+        if self.scheduler is not None:
+            return self.scheduler.submit(model, frame_dict).result()
+        if self.cam_details['model_used'] == "ANPRModel":
+            return model.det_objects(frame_dict)
+        return model.predict(frame_dict)
 
         
     # PTZ_CAM_CONTROL FUNCTIONS
@@ -0,0 +1,153 @@
+import atexit
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from queue import Queue, Empty, Full
+
+
+############ Already recorded events ###########################
+class RecordedIndex:
+    """
+    Bounded LRU map of recently recorded event keys to their recorded value and score,
+    each remembered for at most ttl seconds.
+    """
+    def __init__(self, max_size=10000, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.keys = OrderedDict()
+        self.lock = threading.Lock()
+
+    def update(self, key, value, score, write):
+        """
+        Record the value of a key if it is new or a better reading of it.
+        Args:
+            write (callable): Writes the event, returns False if it could not. The value is only
+                remembered once the write succeeded, so a dropped event is written by a later reading.
+        Returns:
+            bool: True if the key is new or value differs from the recorded one with a higher score,
+                  and the write succeeded.
+        """
+        now = time.monotonic()
+        with self.lock:
+            recorded = self.keys.get(key)
+            if recorded is not None and now - recorded[0] < self.ttl:
+                self.keys.move_to_end(key)
+                recorded_at, recorded_value, recorded_score = recorded
+                if value == recorded_value:
+                    self.keys[key] = (recorded_at, value, max(score, recorded_score))
+                    return False
+                if score <= recorded_score:
+                    return False
+            if not write():
+                return False
+            self.keys[key] = (now, value, score)
+            self.keys.move_to_end(key)
+            while len(self.keys) > self.max_size:
+                self.keys.popitem(last=False)
+            return True
+
+
+############ Asynchronous database writer ######################
+class DetectionWriter:
+    """
+    Writes detection records from a dedicated thread over one long-lived WAL connection.
+
+    Rows are queued without blocking the caller and committed in batches of batch_size rows
+    or every flush_ms milliseconds, whichever comes first. When the queue is full rows are dropped.
+    """
+    _writers = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, db_path='records.db'):
+        """Return the writer of a database file, starting it on first use."""
+        with cls._lock:
+            if db_path not in cls._writers:
+                cls._writers[db_path] = cls(db_path)
+            return cls._writers[db_path]
+
+    def __init__(self, db_path, max_queue=10000, batch_size=100, flush_ms=200):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000.0
+        self.queue = Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.recorded = RecordedIndex()
+        self.maintenance = None  # called with the connection every maintenance_interval seconds, e.g. retention
+        self.maintenance_interval = 3600
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def write(self, sql, params):
+        """Queue one statement with its parameters. Returns False if the queue was full."""
+        try:
+            self.queue.put_nowait((sql, params))
+            return True
+        except Full:
+            self.dropped += 1
+            return False
+
+    def write_best(self, key, value, score, sql, params):
+        """
+        Queue a statement the first time an event key is seen, e.g. (camera, track id),
+        and again whenever a different value, e.g. the class or plate, arrives with a higher score.
+        The statement is expected to upsert, so the event keeps one row.
+        Returns True if the statement was queued.
+        """
+        return self.recorded.update(key, value, score, lambda: self.write(sql, params))
+
+    def stop(self):
+        """Flush the queued rows and stop the writer thread."""
+        if not self.stopped.is_set():
+            self.stopped.set()
+            self.thread.join(timeout=5)
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")  # readers are not blocked while a batch is written
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def run(self):
+        conn = self.connect()
+        pending = []
+        deadline = 0.0
+        next_maintenance = time.monotonic() + self.maintenance_interval
+        while not (self.stopped.is_set() and self.queue.empty()):
+            timeout = self.flush_interval if not pending else max(deadline - time.monotonic(), 0.0)
+            try:
+                pending.append(self.queue.get(timeout=timeout))
+                if len(pending) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+            except Empty:
+                pass
+            if pending and (len(pending) >= self.batch_size or time.monotonic() >= deadline or self.stopped.is_set()):
+                self.flush(conn, pending)
+                pending = []
+            if self.maintenance is not None and time.monotonic() >= next_maintenance:
+                next_maintenance = time.monotonic() + self.maintenance_interval
+                try:
+                    self.maintenance(conn)
+                except sqlite3.Error as e:
+                    print(f"Database error: {e}")
+        if pending:
+            self.flush(conn, pending)
+        conn.close()
+
+    def flush(self, conn, pending):
+        """Commit the pending statements in one transaction, grouping consecutive identical statements."""
+        try:
+            with conn:
+                start = 0
+                while start < len(pending):
+                    sql = pending[start][0]
+                    end = start
+                    while end < len(pending) and pending[end][0] == sql:
+                        end += 1
+                    conn.executemany(sql, [params for _, params in pending[start:end]])
+                    start = end
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
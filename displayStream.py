@@ -0,0 +1,122 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+
+############ Display frame encoder #############################
+class FrameEncoder:
+    """
+    Downscales frames to the tile size and JPEG encodes them for the UI.
+
+    The resized image is written into one buffer reused for every frame, so the cost of a
+    displayed frame depends on the tile size and not on the resolution of the source.
+    """
+    def __init__(self, width=720, height=480, quality=70):
+        self.width = width
+        self.height = height
+        self.params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+        self.buffer = None
+
+    def resize(self, frame):
+        """
+        Fit a frame into the tile, keeping its aspect ratio. Frames smaller than the tile are kept as they are.
+        Returns:
+            tuple: (image, scale) where scale maps frame coordinates onto the image.
+                   The image is overwritten by the next call.
+        """
+        h, w = frame.shape[:2]
+        scale = min(self.width / w, self.height / h, 1.0)
+        size = (max(int(w * scale), 1), max(int(h * scale), 1))
+        if self.buffer is None or self.buffer.shape[:2] != (size[1], size[0]) or self.buffer.shape[2:] != frame.shape[2:]:
+            self.buffer = np.empty((size[1], size[0]) + frame.shape[2:], dtype=frame.dtype)
+        if scale == 1.0:
+            np.copyto(self.buffer, frame)
+        else:
+            cv2.resize(frame, size, dst=self.buffer, interpolation=cv2.INTER_AREA)
+        return self.buffer, scale
+
+    def encode(self, image):
+        """JPEG encode an image. Returns the encoded bytes as a numpy buffer or None on failure."""
+        ok, buffer = cv2.imencode(".jpg", image, self.params)
+        return buffer if ok else None
+
+
+############ MJPEG over HTTP ###################################
+class MjpegServer:
+    """
+    Serves the latest JPEG of every camera as a multipart MJPEG stream at http://host:port/<camera>.
+
+    The UI image points at the stream URL, so frames no longer go through the Flet websocket.
+    Every client is sent only the newest frame, slow clients skip frames instead of queueing them.
+    The streams are unauthenticated, so the server only listens on the loopback interface unless
+    another bind address is configured explicitly.
+    """
+    _servers = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, port, host='127.0.0.1'):
+        """Return the server listening on a port, starting it on first use."""
+        with cls._lock:
+            if port not in cls._servers:
+                cls._servers[port] = cls(port, host)
+            return cls._servers[port]
+
+    def __init__(self, port, host='127.0.0.1'):
+        self.port = port
+        self.frames = {}  # camera -> (sequence number, jpeg bytes)
+        self.condition = threading.Condition()
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, camera, host='localhost'):
+        return f"http://{host}:{self.port}/{camera}"
+
+    def publish(self, camera, jpeg):
+        """Make a JPEG the current frame of a camera and wake up its clients."""
+        with self.condition:
+            sequence = self.frames.get(camera, (0, None))[0] + 1
+            self.frames[camera] = (sequence, bytes(jpeg))
+            self.condition.notify_all()
+
+    def wait_frame(self, camera, last_sequence, timeout=1.0):
+        """
+        Wait for a frame of a camera newer than last_sequence.
+        Returns:
+            tuple: (sequence, jpeg), or None if no new frame arrived within the timeout.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.frames.get(camera, (0, None))[0] != last_sequence, timeout)
+            frame = self.frames.get(camera)
+            return frame if frame is not None and frame[0] != last_sequence else None
+
+    def make_handler(self):
+        server = self
+
+        class MjpegHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                camera = self.path.strip('/')
+                self.send_response(200)
+                self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                sequence = 0
+                try:
+                    while True:
+                        frame = server.wait_frame(camera, sequence)
+                        if frame is None:
+                            continue
+                        sequence, jpeg = frame
+                        self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n"
+                                         + f"Content-Length: {len(jpeg)}\r\n\r\n".encode() + jpeg + b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client went away
+
+            def log_message(self, format, *args):
+                pass  # no line per request on the console
+
+        return MjpegHandler
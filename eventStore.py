@@ -0,0 +1,176 @@
+import datetime
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from plateSearch import PlateSearch
+
+RUN_ID = int(time.time())  # track ids restart with every run of the application
+
+# One row per tracked passage, a better reading of the same track replaces its class and plate
+INSERT_EVENT = """
+    INSERT INTO events (camera, ts, run_id, track_id, class, plate, confidence, bbox, snapshot)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (camera, run_id, track_id) DO UPDATE SET
+        class = excluded.class, plate = excluded.plate, confidence = excluded.confidence, bbox = excluded.bbox
+"""
+
+
+############ Detection events database #########################
+class EventStore:
+    """Single indexed events table shared by all cameras, with migration of the old per-camera tables."""
+    def __init__(self, db_path='records.db', retention_days=30):
+        self.db_path = db_path
+        self.retention_days = retention_days  # events older than this are deleted, None keeps everything
+
+    def initialize(self):
+        """Create the schema, move the rows of old per-camera tables into it and apply the retention policy."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.create_schema(conn)
+            self.migrate_camera_tables(conn)
+            self.apply_retention(conn)
+
+    @staticmethod
+    def create_schema(conn):
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY,
+                camera TEXT NOT NULL,
+                ts REAL NOT NULL,
+                run_id INTEGER NOT NULL DEFAULT 0,
+                track_id INTEGER,
+                class TEXT,
+                plate TEXT NOT NULL DEFAULT '',
+                confidence REAL,
+                bbox TEXT,
+                snapshot TEXT
+            );
+            CREATE INDEX IF NOT EXISTS events_camera_ts ON events (camera, ts);
+            CREATE INDEX IF NOT EXISTS events_plate ON events (plate);
+            CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+        """)
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name='events_track'").fetchone() is None:
+            EventStore.migrate_passage_index(conn)
+
+    @staticmethod
+    def migrate_passage_index(conn):
+        """Replace the per class and plate unique index by one row per (camera, run, track), keeping the best row."""
+        with conn:
+            conn.execute("DROP INDEX IF EXISTS events_passage")
+            # Rows migrated from the per-camera tables mix runs, their track ids do not identify a passage
+            conn.execute("UPDATE events SET track_id = NULL WHERE run_id = 0")
+            conn.execute("""
+                DELETE FROM events WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, row_number() OVER (
+                            PARTITION BY camera, run_id, track_id ORDER BY confidence DESC, id) AS passage_row
+                        FROM events WHERE track_id IS NOT NULL
+                    ) WHERE passage_row > 1
+                )
+            """)
+            conn.execute("CREATE UNIQUE INDEX events_track ON events (camera, run_id, track_id)")
+
+    @staticmethod
+    def migrate_camera_tables(conn):
+        """Copy the rows of the old one-table-per-camera layout into events and drop those tables."""
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name != 'events' AND name NOT LIKE 'sqlite_%'")]
+        now = time.time()
+        today = datetime.date.fromtimestamp(now)
+        for table in tables:
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+            if 'Time' not in columns or 'Type' not in columns:
+                continue
+            plate = "LicenseNumber" if 'LicenseNumber' in columns else "''"
+            rows = conn.execute(f"SELECT Time, Type, {plate} FROM {table} ORDER BY ROWID").fetchall()
+            events = []
+            for detection_time, object_type, license_number in rows:
+                # The old tables only kept the time of day, assume the rows are from the last 24 hours:
+                # today, or yesterday if that time of day is still to come
+                try:
+                    ts = datetime.datetime.combine(today, datetime.time.fromisoformat(detection_time)).timestamp()
+                except (TypeError, ValueError):
+                    ts = now
+                if ts > now:
+                    ts -= 86400
+                # The old track ids restarted with every run, they are not kept
+                events.append((table, ts, 0, None, object_type, license_number or '', None, None, None))
+            with conn:
+                conn.executemany(INSERT_EVENT, events)
+                conn.execute(f"DROP TABLE {table}")
+            print(f"Migrated {len(events)} records of table {table} into events")
+
+    def apply_retention(self, conn):
+        """Delete the events older than the retention period."""
+        if not self.retention_days:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        with conn:
+            conn.execute("DELETE FROM events WHERE ts < ?", (cutoff,))
+        PlateSearch.prune_index(conn, cutoff)  # the plate index would keep counting the deleted events
+
+
+############ Latest events of a camera #########################
+class RecentEvents:
+    """
+    Ring buffer of the latest events of one camera, fed by the detection pipeline.
+
+    The version counter changes with every added event, so the UI only redraws its table
+    when the contents changed instead of querying the database after every frame.
+    """
+    _buffers = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, camera, size=3):
+        """Return the buffer of a camera, creating it on first use."""
+        with cls._lock:
+            if camera not in cls._buffers:
+                cls._buffers[camera] = cls(size)
+            return cls._buffers[camera]
+
+    def __init__(self, size=3):
+        self.events = deque(maxlen=size)
+        self.version = 0
+        self.seeded = False
+        self.lock = threading.Lock()
+
+    def add(self, ts, object_type, plate='', key=None):
+        """Add an event, a later reading of the same key (e.g. a track) replaces its class and plate in place."""
+        with self.lock:
+            for i, (event_key, event) in enumerate(self.events):
+                if key is not None and event_key == key:
+                    self.events[i] = (key, (event[0], object_type, plate))
+                    break
+            else:
+                self.events.append((key, (ts, object_type, plate)))
+            self.version += 1
+
+    def seed(self, rows):
+        """Fill the buffer once with (ts, class, plate) rows read from the database, newest first."""
+        with self.lock:
+            if self.seeded:
+                return
+            self.seeded = True
+            # stored events are older than the ones the pipeline already added
+            for row in rows[:self.events.maxlen - len(self.events)]:
+                self.events.appendleft((None, tuple(row)))
+            self.version += 1
+
+    def replace(self, rows):
+        """Take over the (ts, class, plate) rows, newest first, kept by the worker process of the camera."""
+        with self.lock:
+            self.events.clear()
+            self.events.extend((None, tuple(row)) for row in reversed(rows[:self.events.maxlen]))
+            self.seeded = True
+            self.version += 1
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple: (version, events) with the (ts, class, plate) events newest first.
+        """
+        with self.lock:
+            return self.version, [event for _, event in reversed(self.events)]
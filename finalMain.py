@@ -3,6 +3,9 @@ import yaml
 import logging
 from cameraWindow import WindowStreamer
 from cameraSelector import CameraSelector
+from inferenceScheduler import InferenceScheduler
+from eventStore import EventStore
+from dbWriter import DetectionWriter
 
 ############ The entire application #############################
 class Application():
@@ -14,9 +17,24 @@ class Application():
 
     def load_cameras(self):
         cameras = self.config.get('cameras', [])
+        # One events table for all cameras, old per-camera tables are migrated into it
+        event_store = EventStore('records.db', retention_days=self.config.get('database', {}).get('retention_days', 30))
+        event_store.initialize()
+        DetectionWriter.get('records.db').maintenance = event_store.apply_retention
+        # 'process' runs every camera in its own worker process, 'thread' runs them all in this one
+        runtime = self.config.get('runtime', {}).get('mode', 'thread')
+        scheduler_config = self.config.get('scheduler', {})
+        scheduler = None
+        if scheduler_config.get('enabled', False) and runtime != 'process':
+            # One scheduler batches the detector calls of all cameras, worker processes each run their own models
+            scheduler = InferenceScheduler(latency_ms=scheduler_config.get('latency_ms', 30),
+                                           max_batch=scheduler_config.get('max_batch', 8))
         for cam_config in cameras:
             for cam_name, cam_details in cam_config.items():
-                self.camera_windows[cam_name] = WindowStreamer(cam_name, cam_details)
+                try:
+                    self.camera_windows[cam_name] = WindowStreamer(cam_name, cam_details, scheduler, runtime)
+                except ValueError as e:
+                    print(f"Config error in camera {cam_name}, camera skipped: {e}")
         print(self.camera_windows)      
 
     def on_camera_selection_change(self, selected_cameras):
@@ -0,0 +1,88 @@
+import threading
+
+from sharedFrames import retain_frame, release_frame
+
+
+############ Latest frame wins slot ############################
+class LatestFrameSlot:
+    """
+    Holds only the newest frame. put() replaces an unconsumed frame, get() blocks until one arrives.
+    Frames of a FrameRing are retained while they wait, get() hands that reference to the caller.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.item = None
+        self.dropped = 0  # frames replaced before anyone consumed them
+
+    def put(self, item):
+        retain_frame(item)
+        with self.condition:
+            if self.item is not None:
+                self.dropped += 1
+                release_frame(self.item)
+            self.item = item
+            self.condition.notify_all()
+
+    def get(self, timeout=None):
+        """
+        Take the newest frame, waiting up to timeout seconds for one.
+        Returns:
+            The frame, or None if the timeout expired first. The caller releases it with release_frame.
+        """
+        with self.condition:
+            if self.item is None:
+                self.condition.wait(timeout)
+            item, self.item = self.item, None
+            return item
+
+
+############ Latest frame for several consumers ################
+class FrameChannel:
+    """
+    Publishes the newest frame of a source to any number of consumers.
+
+    Every frame gets a sequence number. Consumers wait for a frame newer than the last one they
+    took, so each reads at its own pace and skips the frames it was too slow for.
+    The channel holds a reference on its current frame and gives every consumer one of its own.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.item = None
+        self.sequence = 0
+        self.closed = False
+
+    def publish(self, item):
+        retain_frame(item)
+        with self.condition:
+            release_frame(self.item)
+            self.item = item
+            self.sequence += 1
+            self.condition.notify_all()
+
+    def latest(self):
+        """The newest frame without waiting, None before the first one. The caller releases it."""
+        with self.condition:
+            retain_frame(self.item)
+            return self.item
+
+    def close(self):
+        """Wake up the consumers for good, e.g. when the source ended."""
+        with self.condition:
+            self.closed = True
+            release_frame(self.item)
+            self.item = None
+            self.condition.notify_all()
+
+    def wait_newer(self, last_sequence, timeout=None):
+        """
+        Wait up to timeout seconds for a frame newer than last_sequence.
+        Returns:
+            tuple: (sequence, frame), or None if the timeout expired or the channel was closed first.
+                   The caller releases the frame with release_frame.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence != last_sequence or self.closed, timeout)
+            if self.sequence == last_sequence or self.closed:
+                return None
+            retain_frame(self.item)
+            return self.sequence, self.item
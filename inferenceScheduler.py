@@ -0,0 +1,71 @@
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+
+############ Cross camera inference scheduler ##################
+class InferenceScheduler:
+    """
+    Collects the frames of every camera and runs the shared detector on them in batches.
+
+    A batch is closed when max_batch frames are waiting or latency_ms passed since its first frame,
+    so a lone camera waits at most latency_ms while busy boxes get larger, cheaper batches.
+    """
+    def __init__(self, latency_ms=30, max_batch=8):
+        self.latency = latency_ms / 1000.0
+        self.max_batch = max_batch
+        self.requests = Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, model, frameDict):
+        """
+        Queue a frame of a camera for detection.
+        Args:
+            model (BaseModel): The camera's model, holding its detector and tracker.
+            frameDict (dict): Frame dictionary with the 'frame' to detect on.
+        Returns:
+            Future: Resolves to frameDict with the camera's tracked 'detected_objects'.
+        """
+        future = Future()
+        self.requests.put((model, frameDict, future))
+        return future
+
+    def run(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.monotonic() + self.latency
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except Empty:
+                    break
+            self.run_batch(batch)
+
+    def run_batch(self, batch):
+        """Run one detector call per shared detector and argument set, then hand every camera its result."""
+        groups = {}
+        for request in batch:
+            model = request[0]
+            key = (id(model.detector), repr(sorted(model.detector_args.items())))
+            groups.setdefault(key, []).append(request)
+
+        for requests in groups.values():
+            model = requests[0][0]
+            try:
+                images = [camera_model.detection_input(frameDict) for camera_model, frameDict, _ in requests]
+                results = model.detector.predict(images, **model.detector_args)
+            except Exception as e:
+                for _, _, future in requests:
+                    future.set_exception(e)
+                continue
+            # Tracking stays per camera
+            for (model, frameDict, future), result in zip(requests, results):
+                try:
+                    future.set_result(model.process_detections(frameDict, result))
+                except Exception as e:
+                    future.set_exception(e)
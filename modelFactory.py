@@ -2,22 +2,162 @@ from ultralytics import YOLO
 from paddleocr import PaddleOCR
 import re
 import cv2
-from sort.sort import Sort
+from objectTracker import ObjectTracker
+from trackCache import PlateTrackCache
+from plateQuality import PlateQualityGate, BestPlateCrops
+from regionFilter import InferenceRegion, TriggerLine
+from dbWriter import DetectionWriter
+from eventStore import INSERT_EVENT, RUN_ID, RecentEvents
+import time
 import base64
-import numpy as np
-import sqlite3,datetime
+import threading
+
+def letterbox(image, size, color=(114, 114, 114)):
+    """
+    Resize an image to fit a square of the given size keeping its aspect ratio and pad the rest.
+    Args:
+        image (numpy.ndarray): Image to resize.
+        size (int): Side of the output square.
+    Returns:
+        tuple: (padded image, scale, (pad_x, pad_y)) used to map boxes back to the source image.
+    """
+    h, w = image.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = max(int(round(w * scale)), 1), max(int(round(h * scale)), 1)
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    padded = cv2.copyMakeBorder(resized, pad_y, size - new_h - pad_y, pad_x, size - new_w - pad_x,
+                                cv2.BORDER_CONSTANT, value=color)
+    return padded, scale, (pad_x, pad_y)
+
+############ Shared model weights ##############################
+class SharedModel:
+    """A loaded model shared by several cameras. Calls are serialized because the predictors keep state."""
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+
+    def predict(self, *args, **kwargs):
+        with self.lock:
+            return self.model.predict(*args, **kwargs)
+
+    def text_recognizer(self, *args, **kwargs):
+        with self.lock:
+            return self.model.text_recognizer(*args, **kwargs)
+
+
+class ModelRegistry:
+    """Loads every weight file once per process. Per camera state (trackers, caches) stays in the model classes."""
+    _models = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, key, loader):
+        """Return the shared model stored under key, loading it with loader() on first use."""
+        with cls._lock:
+            if key not in cls._models:
+                cls._models[key] = SharedModel(loader())
+            return cls._models[key]
+
+    @classmethod
+    def yolo(cls, model_path):
+        return cls.get(('yolo', model_path), lambda: YOLO(model_path))
+
+    @classmethod
+    def paddle_ocr(cls, rec_batch_num):
+        return cls.get(('paddleocr', rec_batch_num),
+                       lambda: PaddleOCR(lang='en',det=False, cls=False, rec_batch_num=rec_batch_num))
 
 class BaseModel:
     """A base class for all models. Define the interface here."""
+    detector = None  # shared object detector, batched across cameras by the InferenceScheduler
+    detector_args = {}  # keyword arguments of this camera's detector calls
+    region = None  # InferenceRegion the detector is restricted to
+    inference_width = None  # wider frames are downscaled to this width for the detector, None detects at full size
+
     def predict(self, frame):
         raise NotImplementedError("Predict method should be implemented by the specific model subclass!!!")
 
+    def process_detections(self, frameDict, results):
+        raise NotImplementedError("Process detections method should be implemented by the specific model subclass!!!")
+
+    # Defaults of the ultralytics predictor, passed on every call: the YOLO instance is shared between
+    # cameras and keeps the arguments of previous predict calls, so a key left out would leak in from another camera
+    DEFAULT_CONF = 0.25
+    DEFAULT_IOU = 0.7
+
+    def make_detector_args(self, classes=None, conf=None, iou=None):
+        """
+        Build the detector keyword arguments of a camera, NMS then only keeps the wanted classes.
+        Args:
+            classes (list): Class ids or names to detect, all classes if None.
+            conf (float): Confidence threshold, the detector default if None.
+            iou (float): NMS IoU threshold, the detector default if None.
+        Raises:
+            ValueError: If a class name or id is not one of the detector's classes.
+        """
+        class_ids = None
+        if classes:
+            names = {name: class_id for class_id, name in self.classes.items()}
+            class_ids = []
+            for c in classes:
+                class_id = names.get(c) if isinstance(c, str) else int(c)
+                if class_id not in self.classes:
+                    raise ValueError(f"Unknown detector class {c!r} in 'classes', "
+                                     f"expected one of: {', '.join(self.classes.values())}")
+                class_ids.append(class_id)
+            class_ids = sorted(class_ids)
+        return {
+            'classes': class_ids,
+            'conf': conf if conf is not None else self.DEFAULT_CONF,
+            'iou': iou if iou is not None else self.DEFAULT_IOU,
+        }
+
+    def detection_input(self, frameDict):
+        """
+        Image the detector runs on, the crop of the region of interest when one is configured.
+        A lower resolution 'infer_frame' (e.g. from a substream) is used instead of 'frame' when present,
+        otherwise frames wider than inference_width are detected on a downscaled copy.
+        """
+        image = frameDict.get('infer_frame')
+        if image is None and self.inference_width and frameDict['frame'].shape[1] > self.inference_width:
+            frame_h, frame_w = frameDict['frame'].shape[:2]
+            size = (self.inference_width, max(round(frame_h * self.inference_width / frame_w), 1))
+            image = frameDict['infer_frame'] = cv2.resize(frameDict['frame'], size, interpolation=cv2.INTER_AREA)
+        if image is None:
+            image = frameDict['frame']
+        else:
+            frame_h, frame_w = frameDict['frame'].shape[:2]
+            frameDict['infer_scale'] = (image.shape[1] / frame_w, image.shape[0] / frame_h)
+        if self.region is None:
+            return image
+        crop, frameDict['infer_offset'] = self.region.crop(image, frameDict.get('infer_scale', (1.0, 1.0)))
+        return crop
+
+    def detection_boxes(self, frameDict, results):
+        """Detector boxes in frame coordinates, keeping only the ones inside the region of interest."""
+        boxes = results.boxes.data.cpu().numpy()
+        x_offset, y_offset = frameDict.get('infer_offset', (0, 0))
+        boxes[:, [0, 2]] += x_offset
+        boxes[:, [1, 3]] += y_offset
+        if 'infer_scale' in frameDict:
+            # back from the inference image to the full resolution frame the plates are cropped from
+            x_scale, y_scale = frameDict['infer_scale']
+            boxes[:, [0, 2]] /= x_scale
+            boxes[:, [1, 3]] /= y_scale
+        if self.region is not None and len(boxes):
+            boxes = boxes[self.region.contains_boxes(boxes)]
+        return boxes
+
 ############ Object Detection #################################
 class YOLOv11DetectionModel(BaseModel):
-    def __init__(self, model_path='/home/yash/Desktop/ANPR/yolo11n.pt'):
-        self.model = YOLO(model_path)
-        self.tracker = Sort()
-        self.to_be_tracked_objects = []
+    def __init__(self, model_path='/home/yash/Desktop/ANPR/yolo11n.pt', roi=None, classes=None, conf=None, iou=None,
+                 inference_width=None):
+        self.model = ModelRegistry.yolo(model_path)
+        self.detector = self.model
+        self.region = InferenceRegion(roi) if roi else None
+        self.inference_width = inference_width
+        self.tracker = ObjectTracker()
         self.classes = {0: 'person', 1: 'bicycle', 2: 'car', 3: 'motorcycle', 4: 'airplane', 5: 'bus', 6: 'train', 7: 'truck', 8: 'boat', 9: 'traffic light', 10: 
                         'fire hydrant', 11: 'stop sign', 12: 'parking meter', 13: 'bench', 14: 'bird', 15: 'cat', 16: 'dog', 17: 'horse', 18: 'sheep', 19: 'cow', 
                         20: 'elephant', 21: 'bear', 22: 'zebra', 23: 'giraffe', 24: 'backpack', 25: 'umbrella', 26: 'handbag', 27: 'tie', 28: 'suitcase', 29: 'frisbee', 
@@ -26,14 +166,19 @@ class YOLOv11DetectionModel(BaseModel):
                         50: 'broccoli', 51: 'carrot', 52: 'hot dog', 53: 'pizza', 54: 'donut', 55: 'cake', 56: 'chair', 57: 'couch', 58: 'potted plant', 59: 'bed', 
                         60: 'dining table', 61: 'toilet', 62: 'tv', 63: 'laptop', 64: 'mouse', 65: 'remote', 66: 'keyboard', 67: 'cell phone', 68: 'microwave', 69: 'oven', 
                         70: 'toaster', 71: 'sink', 72: 'refrigerator', 73: 'book', 74: 'clock', 75: 'vase', 76: 'scissors', 77: 'teddy bear', 78: 'hair drier', 79: 'toothbrush'}
+        self.detector_args = self.make_detector_args(classes, conf, iou)
 
     def predict(self,frameDict):
-            frame = frameDict['frame']
             # Perform inference
-            results = self.model.predict(frame)[0]  #,classes=list(self.vehicle_class.keys())
+            results = self.model.predict(self.detection_input(frameDict), **self.detector_args)[0]
+            return self.process_detections(frameDict, results)
+
+    def process_detections(self, frameDict, results):
+            """Turn the detector results of a frame into tracked objects of frameDict."""
             # Store detected vehicle data
             detected_objects = []
-            for detection in results.boxes.data.tolist():
+            boxes = self.detection_boxes(frameDict, results)
+            for detection in boxes.tolist():
                 x1, y1, x2, y2, score, class_id = detection
                 label = f"Class {int(class_id)}: {score:.2f}"
 
@@ -44,70 +189,50 @@ class YOLOv11DetectionModel(BaseModel):
                     'trackID':""
                     }
                 detected_objects.append(object_data)
-                # Create tracking box
-                self.to_be_tracked_objects.append([int(x1), int(y1), int(x2), int(y2), score])
 
             # Add the detection results to frameDict
             frameDict['detected_objects'] = detected_objects
 
-            if self.to_be_tracked_objects:
-                track_ids = self.tracker.update(np.asarray(self.to_be_tracked_objects))
-                # matching tracking ids with detections
-                for obj in frameDict['detected_objects']:
-                    bbox = obj['obj_bbox']
-                    for track in track_ids:
-                        if self.boxes_match(bbox,track[:4].tolist()):
-                            obj['trackID'] = int(track[4])
-                            break
+            # matching tracking ids with detections through the tracker association
+            self.tracker.assign(detected_objects, boxes)
 
             return frameDict
     
-    def plot_bounding_boxes(self,frame,frameDict,cam_name):
+    def plot_bounding_boxes(self,frame,frameDict,cam_name,scale=1.0):
+        """
+        Draw the detected objects on a frame.
+        Args:
+            scale (float): Factor mapping the detection coordinates onto frame, e.g. a downscaled display copy.
+        """
         # Iterate over each detected object
         for obj in frameDict.get('detected_objects', []):
             # Draw bounding box around the vehicle
             objectType = obj['type']
-            objectID = obj['trackID']
-            object_coords = obj['obj_bbox']
-            xv1, yv1, xv2, yv2 = object_coords
+            xv1, yv1, xv2, yv2 = (int(v * scale) for v in obj['obj_bbox'])
             frame = cv2.rectangle(frame, (xv1,yv1), (xv2,yv2), (0, 255, 0), 2)  # Green box for vehicle
             frame = cv2.putText(frame, f"{objectType}", (xv1, yv1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2, cv2.LINE_AA)
- 
-            #update the db if the record doesn't exists already 
-            self.insert_detection(objectID, objectType, cam_name)
                     
         # Return the frame with bounding boxes
         return frame
+
+    def record_detections(self, frameDict, cam_name):
+        """Record the tracked objects of a processed frame, one row per track"""
+        for obj in frameDict.get('detected_objects', []):
+            #insert the track, or update its class when a more confident detection arrives
+            self.insert_detection(obj['trackID'], obj['type'], cam_name, obj['confidence'], obj['obj_bbox'])
     
-    @staticmethod
-    def boxes_match(bbox1, bbox2, threshold=5):
-        """Compare two bounding boxes for approximate matching."""
-        return all(abs(float(bbox1[i]) - float(bbox2[i])) <= threshold for i in range(4))
-
-    def insert_detection(self, tracking_id, object_type,cam_name):
-        """Insert a new detection record"""
-        with sqlite3.connect('records.db') as conn:
-            cursor = conn.cursor()
-            try:
-                # Check for existing record
-                # cursor.execute(
-                #     f"SELECT 1 FROM {cam_name} WHERE  Type = ?", 
-                #     (tracking_id, object_type)     
-                # )
-                # if cursor.fetchone():
-                #     #print(f"TrackingID {tracking_id} already exists.")
-                #     return
-
-                # Insert new record
-                detection_time = datetime.datetime.now().strftime("%H:%M:%S")
-                cursor.execute(
-                    f"INSERT INTO {cam_name} (Time, Type) VALUES (?,?)",
-                    (detection_time, object_type),
-                )
-                conn.commit()
-                
-            except sqlite3.Error as e:
-                print(f"Database error: {e}")
+    def insert_detection(self, tracking_id, object_type,cam_name, confidence=None, bbox=None):
+        """Queue a detection event for a tracked object, again only if its class changes with a higher confidence"""
+        if tracking_id == "":
+            return  # not confirmed by the tracker yet
+        ts = time.time()
+        if DetectionWriter.get('records.db').write_best(
+            (cam_name, tracking_id), object_type, confidence or 0.0,
+            INSERT_EVENT,
+            (cam_name, ts, RUN_ID, tracking_id, object_type, '', confidence,
+             ",".join(map(str, bbox)) if bbox else None, None),
+        ):
+            RecentEvents.get(cam_name).add(ts, object_type, key=tracking_id)  # pushed to the camera's table in the UI
 
 
 
@@ -115,10 +240,10 @@ class YOLOv11DetectionModel(BaseModel):
 ########### Segmentation Model #################################
 class YOLOv11SegmentationModel(BaseModel):
     def __init__(self, model_path='yolov11n-seg.pt'):
-        self.model = YOLO(model_path)
+        self.model = ModelRegistry.yolo(model_path)
 
     def predict(self, frame):
-        results = self.model(frame, task="segment")  # Segmentation task
+        results = self.model.predict(frame, task="segment")  # Segmentation task
         return results[0]
 
 
@@ -127,11 +252,16 @@ class YOLOv11SegmentationModel(BaseModel):
 
 ######## ANPR for number plate detection ######################
 class ANPRModel(BaseModel):
-    def __init__(self):
-        self.objectModel = YOLO("/home/yash/Desktop/ANPR/yolo11n.pt")
-        self.plateModel = YOLO('/home/yash/Desktop/ANPR/license_plate_detector.pt')
-        self.ocr = PaddleOCR(lang='en',det=False, cls=False)
-        self.tracker = Sort()
+    def __init__(self, plate_batch_size=16, plate_imgsz=640, ocr_batch_size=16, ocr_stable_frames=3,
+                 roi=None, trigger_line=None, conf=None, iou=None, inference_width=None, plate_quality=None):
+        self.objectModel = ModelRegistry.yolo("/home/yash/Desktop/ANPR/yolo11n.pt")
+        self.plateModel = ModelRegistry.yolo('/home/yash/Desktop/ANPR/license_plate_detector.pt')
+        self.ocr = ModelRegistry.paddle_ocr(ocr_batch_size)
+        self.detector = self.objectModel
+        self.region = InferenceRegion(roi) if roi else None
+        self.inference_width = inference_width  # vehicles are detected small, plates are cropped from the full frame
+        self.trigger_line = TriggerLine(trigger_line) if trigger_line else None  # plates are read after crossing it
+        self.tracker = ObjectTracker()
         self.classes = {0: 'person', 1: 'bicycle', 2: 'car', 3: 'motorcycle', 4: 'airplane', 5: 'bus', 6: 'train', 7: 'truck', 8: 'boat', 9: 'traffic light', 10: 
                         'fire hydrant', 11: 'stop sign', 12: 'parking meter', 13: 'bench', 14: 'bird', 15: 'cat', 16: 'dog', 17: 'horse', 18: 'sheep', 19: 'cow', 
                         20: 'elephant', 21: 'bear', 22: 'zebra', 23: 'giraffe', 24: 'backpack', 25: 'umbrella', 26: 'handbag', 27: 'tie', 28: 'suitcase', 29: 'frisbee', 
@@ -141,16 +271,27 @@ class ANPRModel(BaseModel):
                         60: 'dining table', 61: 'toilet', 62: 'tv', 63: 'laptop', 64: 'mouse', 65: 'remote', 66: 'keyboard', 67: 'cell phone', 68: 'microwave', 69: 'oven', 
                         70: 'toaster', 71: 'sink', 72: 'refrigerator', 73: 'book', 74: 'clock', 75: 'vase', 76: 'scissors', 77: 'teddy bear', 78: 'hair drier', 79: 'toothbrush'}
         self.vehicle_class = {2: 'car', 3: 'motorcycle', 4: 'airplane', 5: 'bus', 6: 'train', 7: 'truck'}
+        # Only vehicles go through NMS, tracking and plate reading
+        self.detector_args = self.make_detector_args(list(self.vehicle_class.keys()), conf, iou)
        
-        self.to_be_tracked_objects = []
+        self.plate_batch_size = plate_batch_size  # max vehicle crops per plate detector call
+        self.plate_imgsz = plate_imgsz  # shared letterbox size of the vehicle crops
+        self.two_line_ratio = 2.0  # plates narrower than this width/height ratio are read as two lines
+        self.track_cache = PlateTrackCache(self.format_license, stable_frames=ocr_stable_frames)  # voted plate per track
+        self.plate_gate = PlateQualityGate(**(plate_quality or {}))  # unreadable plate crops skip OCR
+        self.best_crops = BestPlateCrops()  # read once more when a track ends without a plate
 
     def det_objects(self,frameDict):
-            frame = frameDict['frame']
             # Perform inference
-            results = self.objectModel.predict(frame)[0]  #,classes=list(self.vehicle_class.keys())
+            results = self.objectModel.predict(self.detection_input(frameDict), **self.detector_args)[0]
+            return self.process_detections(frameDict, results)
+
+    def process_detections(self, frameDict, results):
+            """Turn the detector results of a frame into tracked vehicles of frameDict."""
             # Store detected vehicle data
             detected_objects = []
-            for object in results.boxes.data.tolist():
+            boxes = self.detection_boxes(frameDict, results)
+            for object in boxes.tolist():
                 x1_o, y1_o, x2_o, y2_o, score, class_obj = object
                 # Extract relevant information about each detected vehicle
                 object_data = {
@@ -161,69 +302,164 @@ class ANPRModel(BaseModel):
                     'trackID':""
                     }
                 detected_objects.append(object_data)
-                # Create tracking box
-                self.to_be_tracked_objects.append([int(x1_o), int(y1_o), int(x2_o), int(y2_o), score])
 
             # Add the detection results to frameDict
             frameDict['detected_objects'] = detected_objects
 
-            if self.to_be_tracked_objects:
-                track_ids = self.tracker.update(np.asarray(self.to_be_tracked_objects))
-                # matching tracking ids with detections
-                for obj in frameDict['detected_objects']:
-                    bbox = obj['obj_bbox']
-                    for track in track_ids:
-                        if self.boxes_match(bbox,track[:4].tolist()):
-                            obj['trackID'] = int(track[4])
-                            break
+            # matching tracking ids with detections through the tracker association
+            self.tracker.assign(detected_objects, boxes)
+
+            # forget the plate readings of tracks dropped by SORT
+            active_track_ids = self.tracker.active_track_ids()
+            self.track_cache.evict(active_track_ids)
+            if self.trigger_line is not None:
+                self.trigger_line.update(detected_objects, active_track_ids)
 
             return frameDict
     
-    @staticmethod
-    def boxes_match(bbox1, bbox2, threshold=5):
-        """Compare two bounding boxes for approximate matching."""
-        return all(abs(float(bbox1[i]) - float(bbox2[i])) <= threshold for i in range(4))
+    def det_plates_batch(self, crops):
+        """
+        Detect license plates on all vehicle crops of a frame with batched predict calls.
+        Args:
+            crops (list): Vehicle crops (numpy.ndarray).
+        Returns:
+            list: For every crop, a list of [x1, y1, x2, y2, score] in crop coordinates.
+        """
+        plates = []
+        for start in range(0, len(crops), self.plate_batch_size):
+            chunk = crops[start:start + self.plate_batch_size]
+            # Letterbox every crop to the same size so the detector runs them as one batch
+            letterboxed = [letterbox(crop, self.plate_imgsz) for crop in chunk]
+            results = self.plateModel.predict([image for image, _, _ in letterboxed], imgsz=self.plate_imgsz)
+            for crop, (_, scale, (pad_x, pad_y)), result in zip(chunk, letterboxed, results):
+                h, w = crop.shape[:2]
+                boxes = []
+                for x1, y1, x2, y2, score, plate_id in result.boxes.data.tolist():
+                    # Map the box back from the letterboxed image to the vehicle crop
+                    x1 = int(min(max((x1 - pad_x) / scale, 0), w))
+                    y1 = int(min(max((y1 - pad_y) / scale, 0), h))
+                    x2 = int(min(max((x2 - pad_x) / scale, 0), w))
+                    y2 = int(min(max((y2 - pad_y) / scale, 0), h))
+                    if x2 > x1 and y2 > y1:
+                        boxes.append([x1, y1, x2, y2, score])
+                plates.append(boxes)
+        return plates
 
     def det_plates_ocr(self,frameDict):
             frame = frameDict['frame']
-            # Process each detected vehicle
+            # Collect the crop of each detected vehicle
+            vehicles = []
             for obj in frameDict.get('detected_objects', []):
                 coordinates = obj['obj_bbox']
                 type_of_object = obj['type']
                 if type_of_object in self.vehicle_class.values():
+                    # Only read the plates of vehicles that crossed the trigger line
+                    if self.trigger_line is not None and not self.trigger_line.has_crossed(obj['trackID']):
+                        continue
                     # Crop the vehicle region from the frame
                     x_min, y_min, x_max, y_max = coordinates
-                    vehicle_crop = frame[y_min:y_max, x_min:x_max]
-                    # Perform license plate detection on the cropped image
-                    plate_results = self.plateModel.predict(vehicle_crop)[0]
-                    # Add detected plates to the respective vehicle data
-                    for plate in plate_results.boxes.data.tolist():
-                        x1, y1, x2, y2, score, plate_id = plate
-                        plate_roi = vehicle_crop[int(y1):int(y2),int(x1):int(x2)]
-
-                       # Perform OCR on the region of interest (plate_roi)
-                        ocr_result = self.ocr.ocr(plate_roi)
-
-                        # Extract the text from the OCR result, skipping None values
-                        lines = [res[1][0] for i in ocr_result if i is not None for res in i if res[1] is not None and res[1][0] is not None]
-                        # Concatenate all the lines into a single string
-                        final_text = "".join(lines)
-
-                        print("Final text:", final_text)
-
-                        if final_text!='':
-                            final_text = self.format_license(final_text) # format the text as per rules
-                            
-                            
-                        plate_data = {
-                            'plate_bbox': [ int(x1), int(y1), int(x2), int(y2)],
-                            'text' : final_text
-                        }
-                        obj['plates'].append(plate_data)
-                else:
-                    continue
+                    vehicle_crop = frame[max(y_min, 0):y_max, max(x_min, 0):x_max]
+                    if vehicle_crop.size == 0:
+                        continue
+                    # Reuse the cached reading of tracks that are already read reliably
+                    quality = self.track_cache.crop_quality(vehicle_crop)
+                    if not self.track_cache.needs_read(obj['trackID'], quality):
+                        obj['plates'] = self.track_cache.cached_plates(obj['trackID'])
+                        continue
+                    vehicles.append((obj, vehicle_crop, quality))
+
+            # Perform license plate detection on all the cropped images at once
+            plate_boxes = self.det_plates_batch([vehicle_crop for _, vehicle_crop, _ in vehicles])
+
+            # Collect every plate region of the frame that is worth reading
+            plate_rois = []
+            plate_owners = []
+            for (obj, vehicle_crop, _), plates in zip(vehicles, plate_boxes):
+                for x1, y1, x2, y2, score in plates:
+                    plate_roi = vehicle_crop[y1:y2, x1:x2]
+                    plate_quality = self.plate_gate.assess(plate_roi, score)
+                    if plate_quality == 0.0:
+                        # Too small, blurred or implausible to read, keep the box for display only
+                        obj['plates'].append({'plate_bbox': [x1, y1, x2, y2], 'text': '', 'raw_text': '', 'ocr_conf': 0.0})
+                        continue
+                    self.best_crops.offer(obj, plate_roi, [x1, y1, x2, y2], plate_quality)
+                    plate_rois.append(plate_roi)
+                    plate_owners.append((obj, [x1, y1, x2, y2]))
+
+            # Tracks that ended without a plate get one last read of their best crop, in the same OCR call
+            finished = self.best_crops.pop_finished(self.tracker.active_track_ids())
+
+            # Perform OCR on all the regions of interest in a single call
+            ocr_results = self.recognize_plates(plate_rois + [entry['roi'] for _, entry in finished])
+            final_results = ocr_results[len(plate_rois):]
+
+            # Add detected plates to the respective vehicle data
+            for (obj, plate_bbox), (raw_text, ocr_conf) in zip(plate_owners, ocr_results):
+                final_text = ''
+                if raw_text!='' and obj['trackID']=="":
+                    final_text = self.format_license(raw_text) # untracked vehicles only get a single read
+                    
+                    
+                plate_data = {
+                    'plate_bbox': plate_bbox,
+                    'text' : final_text,
+                    'raw_text': raw_text,
+                    'ocr_conf': ocr_conf
+                }
+                obj['plates'].append(plate_data)
+
+            # Vote with the reads of every tracked vehicle and show its consensus plate
+            for obj, _, quality in vehicles:
+                consensus = self.track_cache.update(obj['trackID'], obj['plates'], quality)
+                if obj['trackID'] != "":
+                    self.best_crops.set_text(obj['trackID'], consensus)
+                    for plate in obj['plates']:
+                        plate['text'] = consensus
+
+            # Ended tracks read from their best crop are recorded with the frame they ended on
+            frameDict['finished_objects'] = []
+            for (track_id, entry), (raw_text, ocr_conf) in zip(finished, final_results):
+                final_text = self.format_license(raw_text) if raw_text != '' else ''
+                if final_text != '':
+                    frameDict['finished_objects'].append({
+                        'obj_bbox': entry['obj_bbox'], 'type': entry['type'], 'trackID': track_id,
+                        'plates': [{'plate_bbox': entry['plate_bbox'], 'text': final_text,
+                                    'raw_text': raw_text, 'ocr_conf': ocr_conf}]})
             return frameDict
 
+    def recognize_plates(self, plate_rois):
+        """
+        Recognize the text of many plate regions with one batched call to the OCR recognizer.
+        Args:
+            plate_rois (list): Plate regions (numpy.ndarray) from one or several frames.
+        Returns:
+            list: (text, confidence) for every plate region.
+        """
+        if not plate_rois:
+            return []
+        lines = []
+        line_owners = []
+        for index, plate_roi in enumerate(plate_rois):
+            h, w = plate_roi.shape[:2]
+            if w < self.two_line_ratio * h:
+                # Square plates carry two rows of characters, recognize each row separately
+                lines.extend([plate_roi[:h // 2], plate_roi[h // 2:]])
+                line_owners.extend([index, index])
+            else:
+                lines.append(plate_roi)
+                line_owners.append(index)
+
+        # The recognizer resizes every line to its input height and pads them into batches of rec_batch_num
+        rec_results, _ = self.ocr.text_recognizer(lines)
+
+        texts = [[] for _ in plate_rois]
+        confidences = [[] for _ in plate_rois]
+        for index, (text, confidence) in zip(line_owners, rec_results):
+            if text:
+                texts[index].append(text)
+                confidences[index].append(float(confidence))
+        return [("".join(text), min(conf) if conf else 0.0) for text, conf in zip(texts, confidences)]
+
 
     def format_license(self,text):
         """
@@ -235,7 +471,7 @@ class ANPRModel(BaseModel):
         """
         license_plate_ = ''
         # Remove invalid characters
-        ocr_text = re.sub(r'[^A-Za-z0-9]', '', text)
+        ocr_text = re.sub(r'[^A-Za-z0-9]', '', text).upper()
         patterns = [
                   r'^[A-Z]{2}\s?\d{1,2}\s?[A-Z]{1,2}\s?\d{1,4}$',  # Standard plates
                     # r'^[A-Z]{2}-TEMP-\d{1,5}$',                      # Temporary plates
@@ -262,11 +498,12 @@ class ANPRModel(BaseModel):
         return license_plate_ 
 
 
-    def plot_bounding_boxes(self,frame,frameDict,cam_name):
+    def plot_bounding_boxes(self,frame,frameDict,cam_name,scale=1.0):
         """
         Function to plot bounding boxes for detected vehicles and plates on the frame.
         Args:
             frameDict (dict): Dictionary containing frame and detected vehicles and plates data.
+            scale (float): Factor mapping the detection coordinates onto frame, e.g. a downscaled display copy.
         Returns:
             frame (numpy.ndarray): The frame with bounding boxes drawn.
         """
@@ -274,58 +511,51 @@ class ANPRModel(BaseModel):
         for obj in frameDict.get('detected_objects', []):
             # Draw bounding box around the vehicle
             objectType = obj['type']
-            objectID = obj['trackID']
-            object_coords = obj['obj_bbox']
-            xv1, yv1, xv2, yv2 = object_coords
-            frame = cv2.rectangle(frame, (xv1,yv1), (xv2,yv2), (0, 255, 0), 2)  # Green box for vehicle
-            frame = cv2.putText(frame, f"{objectType}", (xv1, yv1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2, cv2.LINE_AA)
+            xv1, yv1, xv2, yv2 = obj['obj_bbox']
+            vehicle_box = tuple(int(v * scale) for v in (xv1, yv1, xv2, yv2))
+            frame = cv2.rectangle(frame, vehicle_box[:2], vehicle_box[2:], (0, 255, 0), 2)  # Green box for vehicle
+            frame = cv2.putText(frame, f"{objectType}", (vehicle_box[0], vehicle_box[1]-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2, cv2.LINE_AA)
  
 
             if objectType in self.vehicle_class.values():
                 # Check if plates were detected for the vehicle
                 for plate in obj.get('plates', []):
-                    # Draw bounding box around the plate
-                    plate_coords = plate['plate_bbox']
-                    x_min, y_min, x_max, y_max = plate_coords
+                    # Draw bounding box around the plate, plate boxes are relative to the vehicle crop
+                    x_min, y_min, x_max, y_max = plate['plate_bbox']
+                    plate_box = tuple(int(v * scale) for v in (x_min+xv1, y_min+yv1, x_max+xv1, y_max+yv1))
 
-                    frame = cv2.rectangle(frame, (x_min+xv1, y_min+yv1), (x_max+xv1, y_max+yv1), (255,165,0), 2)  # Red box for plate
+                    frame = cv2.rectangle(frame, plate_box[:2], plate_box[2:], (255,165,0), 2)  # Red box for plate
 
                     # Optionally, add plate text as a label
                     plate_text = plate['text']
 
                     if plate_text != '':
-                        frame = cv2.putText(frame, plate_text, (x_min+xv1, y_min+yv1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0,0,255), 2, cv2.LINE_AA)
-                         #update the db if the record doesn't exists already 
-                        self.insert_detection(objectID, objectType, plate_text,cam_name)
+                        frame = cv2.putText(frame, plate_text, (plate_box[0], plate_box[1]-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0,0,255), 2, cv2.LINE_AA)
                     
         # Return the frame with bounding boxes
         return frame
-    
-    def insert_detection(self, tracking_id, vehicle_type, license_number,cam_name):
-        """Insert a new detection record"""
-        with sqlite3.connect('records.db') as conn:
-            cursor = conn.cursor()
-            try:
-
-                cursor.execute(
-                    f"SELECT 1 FROM {cam_name} WHERE TYPE= ? or  LicenseNumber = ?", 
-                    (vehicle_type,license_number)
-                )
-                if cursor.fetchone():
-                    # print(f"TrackingID {tracking_id} already exists.")
-                    return
-                
-                # Insert new record
-                detection_time = datetime.datetime.now().strftime("%H:%M:%S")
-                cursor.execute(
-                    f"INSERT INTO {cam_name} (Time, Type, LicenseNumber) VALUES (?, ?, ?)",
-                    (detection_time, vehicle_type, license_number),
-                )
-
-                
-                conn.commit()
 
-                
-                
-            except sqlite3.Error as e:
-                print(f"Database error: {e}")
+    def record_detections(self, frameDict, cam_name):
+        """Record the read plates of a processed frame, one row per vehicle passage"""
+        for obj in frameDict.get('detected_objects', []) + frameDict.get('finished_objects', []):
+            if obj['type'] not in self.vehicle_class.values():
+                continue
+            for plate in obj.get('plates', []):
+                if plate['text'] != '':
+                    # a settled consensus outranks readings still being voted on, ended tracks have no cache entry
+                    score = self.track_cache.score(obj['trackID']) or (0, plate.get('ocr_conf') or 0.0)
+                    self.insert_detection(obj['trackID'], obj['type'], plate['text'], cam_name, plate.get('ocr_conf'),
+                                          obj['obj_bbox'], score)
+
+    def insert_detection(self, tracking_id, vehicle_type, license_number,cam_name, confidence=None, bbox=None, score=(0, 0.0)):
+        """Queue a plate event for a vehicle passage, again only if a better reading changes its plate"""
+        if tracking_id == "":
+            return  # not confirmed by the tracker yet
+        ts = time.time()
+        if DetectionWriter.get('records.db').write_best(
+            (cam_name, tracking_id), license_number, score,
+            INSERT_EVENT,
+            (cam_name, ts, RUN_ID, tracking_id, vehicle_type, license_number, confidence,
+             ",".join(map(str, bbox)) if bbox else None, None),
+        ):
+            RecentEvents.get(cam_name).add(ts, vehicle_type, license_number, key=tracking_id)  # pushed to the camera's table in the UI
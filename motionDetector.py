@@ -0,0 +1,62 @@
+import cv2
+
+
+############ Cheap motion detection ############################
+class MotionDetector:
+    """
+    Detects motion on a small greyscale copy of a frame region.
+
+    'diff' compares against a running average background, 'mog2' uses OpenCV's background subtractor.
+    """
+    def __init__(self, method='diff', roi=None, width=160, pixel_threshold=25, min_area=0.002, learning_rate=0.05,
+                 idle_interval=2.0):
+        self.method = method
+        self.roi = roi                          # [x1, y1, x2, y2] in source frame pixels, None for the whole frame
+        self.width = width                      # width the region is downscaled to
+        self.pixel_threshold = pixel_threshold  # grey level change that marks a pixel as changed
+        self.min_area = min_area                # fraction of changed pixels that counts as motion
+        self.learning_rate = learning_rate
+        self.idle_interval = idle_interval      # seconds a static scene is skipped before a frame is processed anyway
+        self.background = None
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False) if method == 'mog2' else None
+
+    def prepare(self, frame):
+        if self.roi is not None:
+            x1, y1, x2, y2 = self.roi
+            frame = frame[y1:y2, x1:x2]
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(int(h * self.width / w), 1)), interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def detect(self, frame):
+        """
+        Check a frame for motion and learn it into the background.
+        Args:
+            frame (numpy.ndarray): Full BGR frame.
+        Returns:
+            bool: True if enough of the region changed.
+        """
+        small = self.prepare(frame)
+        if self.subtractor is not None:
+            mask = self.subtractor.apply(small, learningRate=self.learning_rate)
+            return cv2.countNonZero(mask) > self.min_area * mask.size
+
+        if self.background is None:
+            self.background = small.astype('float32')
+            return True
+        diff = cv2.absdiff(small, cv2.convertScaleAbs(self.background))
+        cv2.accumulateWeighted(small, self.background, self.learning_rate)
+        _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        return cv2.countNonZero(mask) > self.min_area * mask.size
+
+
+def make_motion_detector(config):
+    """Build a MotionDetector from a camera's 'motion' config section, None if motion gating is disabled."""
+    if not config or not config.get('enabled', False):
+        return None
+    return MotionDetector(method=config.get('method', 'diff'),
+                          roi=config.get('roi'),
+                          pixel_threshold=config.get('pixel_threshold', 25),
+                          min_area=config.get('min_area', 0.002),
+                          idle_interval=config.get('idle_interval', 2.0))
@@ -0,0 +1,130 @@
+import numpy as np
+from sort.sort import Sort, KalmanBoxTracker
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None  # fall back to greedy assignment
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Compute the IoU of every pair of boxes at once.
+    Args:
+        boxes_a (numpy.ndarray): (N, >=4) boxes as [x1, y1, x2, y2, ...].
+        boxes_b (numpy.ndarray): (M, >=4) boxes as [x1, y1, x2, y2, ...].
+    Returns:
+        numpy.ndarray: (N, M) IoU matrix.
+    """
+    a = np.asarray(boxes_a, dtype=np.float32)[:, None, :4]
+    b = np.asarray(boxes_b, dtype=np.float32)[None, :, :4]
+    w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = w * h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+
+def assign_boxes(iou, threshold=0.3):
+    """
+    Assign rows to columns of an IoU matrix, Hungarian when scipy is available and greedy otherwise.
+    Args:
+        iou (numpy.ndarray): (N, M) IoU matrix.
+        threshold (float): Minimum IoU of an accepted pair.
+    Returns:
+        tuple: (matched (K, 2) array of [row, col], unmatched rows, unmatched cols).
+    """
+    n, m = iou.shape
+    if n == 0 or m == 0:
+        return np.empty((0, 2), dtype=int), np.arange(n), np.arange(m)
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(-iou)
+    else:
+        # Take pairs from the highest IoU down, skipping rows and columns already used
+        order = np.argsort(-iou, axis=None)
+        order = order[iou.ravel()[order] >= threshold]
+        used_rows = np.zeros(n, dtype=bool)
+        used_cols = np.zeros(m, dtype=bool)
+        rows, cols = [], []
+        for row, col in zip(*np.unravel_index(order, iou.shape)):
+            if not used_rows[row] and not used_cols[col]:
+                used_rows[row] = used_cols[col] = True
+                rows.append(row)
+                cols.append(col)
+        rows, cols = np.asarray(rows, dtype=int), np.asarray(cols, dtype=int)
+    keep = iou[rows, cols] >= threshold
+    matched = np.stack([rows[keep], cols[keep]], axis=1)
+    row_used = np.zeros(n, dtype=bool)
+    row_used[matched[:, 0]] = True
+    col_used = np.zeros(m, dtype=bool)
+    col_used[matched[:, 1]] = True
+    return matched, np.flatnonzero(~row_used), np.flatnonzero(~col_used)
+
+
+############ SORT with association indices #####################
+class IndexedSort(Sort):
+    """SORT tracker that also reports which detection of the frame every returned track was associated with."""
+    def update(self, dets=np.empty((0, 5))):
+        """
+        Update the tracks with the detections of one frame. Must be called once per frame, even without detections.
+        Args:
+            dets (numpy.ndarray): Detections of this frame only, rows of [x1, y1, x2, y2, score].
+        Returns:
+            numpy.ndarray: Rows of [x1, y1, x2, y2, track_id, det_index] for the tracks confirmed on this frame.
+        """
+        self.frame_count += 1
+        # get predicted locations from existing trackers and drop the ones that diverged
+        trks = np.array([trk.predict()[0][:4] for trk in self.trackers], dtype=float).reshape(-1, 4)
+        valid = ~np.isnan(trks).any(axis=1)
+        self.trackers = [trk for trk, ok in zip(self.trackers, valid) if ok]
+        trks = trks[valid]
+        matched, unmatched_dets, _ = assign_boxes(iou_matrix(dets, trks), self.iou_threshold)
+
+        # update matched trackers with assigned detections and remember which detection it was
+        for d, t in matched:
+            self.trackers[t].update(dets[d, :])
+            self.trackers[t].det_index = int(d)
+
+        # create and initialise new trackers for unmatched detections
+        for d in unmatched_dets:
+            trk = KalmanBoxTracker(dets[d, :])
+            trk.det_index = int(d)
+            self.trackers.append(trk)
+
+        ret = []
+        for trk in self.trackers:
+            if trk.time_since_update < 1 and (trk.hit_streak >= self.min_hits or self.frame_count <= self.min_hits):
+                d = trk.get_state()[0]
+                ret.append([d[0], d[1], d[2], d[3], trk.id + 1, trk.det_index])  # +1 as MOT benchmark requires positive
+        # remove dead tracklets
+        self.trackers = [trk for trk in self.trackers if trk.time_since_update <= self.max_age]
+        return np.asarray(ret, dtype=float).reshape(-1, 6)
+
+
+############ Per camera object tracking ########################
+class ObjectTracker:
+    """Tracks the detections of one camera and writes the track ids back into its detected objects."""
+    def __init__(self, **sort_args):
+        self.sort = IndexedSort(**sort_args)
+        self.dets = np.empty((64, 5), dtype=np.float32)  # reused for the detections of every frame
+
+    def assign(self, detected_objects, boxes):
+        """
+        Track the detections of one frame.
+        Args:
+            detected_objects (list): Object dicts of the frame, in the same order as boxes.
+            boxes (numpy.ndarray): Detector output rows of [x1, y1, x2, y2, score, class_id].
+        """
+        if len(boxes) > len(self.dets):
+            self.dets = np.empty((2 * len(boxes), 5), dtype=np.float32)
+        dets = self.dets[:len(boxes)]
+        dets[:, :4] = np.trunc(boxes[:, :4])
+        dets[:, 4] = boxes[:, 4]
+        # Track only the detections of this frame, SORT keeps the history itself
+        for track in self.sort.update(dets):
+            detected_objects[int(track[5])]['trackID'] = int(track[4])
+
+    def active_track_ids(self):
+        """Track ids SORT still keeps alive (its ids are offset by one)."""
+        return {trk.id + 1 for trk in self.sort.trackers}
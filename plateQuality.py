@@ -0,0 +1,74 @@
+import cv2
+
+
+############ Plate crop quality gate ###########################
+class PlateQualityGate:
+    """
+    Cheap checks that reject plate crops OCR cannot read before they reach PaddleOCR.
+
+    A crop is rejected when it is too small, has an implausible aspect ratio, a low plate
+    detector score or a low Laplacian variance (blur). Accepted crops get a quality score
+    so the best crop of a track can be kept.
+    """
+    def __init__(self, min_height=16, min_aspect=0.8, max_aspect=6.0, min_score=0.35, min_sharpness=20.0):
+        self.min_height = min_height
+        self.min_aspect = min_aspect        # two-line plates are close to square
+        self.max_aspect = max_aspect
+        self.min_score = min_score
+        self.min_sharpness = min_sharpness
+        self.rejected = 0                   # crops that never reached OCR
+
+    def assess(self, plate_roi, score):
+        """
+        Score a plate crop.
+        Args:
+            plate_roi (numpy.ndarray): Plate crop.
+            score (float): Confidence of the plate detector for this crop.
+        Returns:
+            float: Quality of the crop, 0.0 if it should not be OCR'd.
+        """
+        h, w = plate_roi.shape[:2]
+        if h < self.min_height or score < self.min_score or not self.min_aspect <= w / h <= self.max_aspect:
+            self.rejected += 1
+            return 0.0
+        gray = cv2.cvtColor(plate_roi, cv2.COLOR_BGR2GRAY)
+        # Measure sharpness at the height the recognizer sees, so it does not depend on the plate size
+        gray = cv2.resize(gray, (max(int(w * 32 / h), 1), 32), interpolation=cv2.INTER_AREA)
+        sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+        if sharpness < self.min_sharpness:
+            self.rejected += 1
+            return 0.0
+        return float(score * h * sharpness / (sharpness + 100.0))
+
+
+############ Best plate crop per track #########################
+class BestPlateCrops:
+    """Best plate crop seen so far of every tracked vehicle, read once more if the track ends without a plate."""
+    def __init__(self):
+        self.entries = {}
+
+    def offer(self, obj, plate_roi, plate_bbox, quality):
+        """Keep a copy of a plate crop if it is the best one of its track so far."""
+        track_id = obj['trackID']
+        if track_id == "":
+            return
+        entry = self.entries.get(track_id)
+        if entry is None or quality > entry['quality']:
+            self.entries[track_id] = {'type': obj['type'], 'obj_bbox': list(obj['obj_bbox']),
+                                      'roi': plate_roi.copy(), 'plate_bbox': plate_bbox, 'quality': quality,
+                                      'text': entry['text'] if entry else ''}
+
+    def set_text(self, track_id, text):
+        """Remember that a track got a plate, its best crop then needs no final read."""
+        if text and track_id in self.entries:
+            self.entries[track_id]['text'] = text
+
+    def pop_finished(self, active_track_ids):
+        """
+        Drop the tracks that ended.
+        Returns:
+            list: (track_id, entry) of the ended tracks that never got a plate.
+        """
+        finished = [track_id for track_id in self.entries if track_id not in active_track_ids]
+        return [(track_id, entry) for track_id, entry in ((t, self.entries.pop(t)) for t in finished)
+                if entry['text'] == '']
@@ -0,0 +1,259 @@
+import argparse
+import datetime
+import re
+import sqlite3
+import sys
+import time
+
+# Characters OCR confuses, folded to one representative so O/0 or B/8 mix-ups still match
+CONFUSIONS = str.maketrans({'O': '0', 'Q': '0', 'D': '0', 'I': '1', 'L': '1', 'Z': '2',
+                            'S': '5', 'G': '6', 'T': '7', 'B': '8'})
+REREAD_WINDOW = 3600  # seconds a passage row can still change, the writer remembers a track this long
+
+
+def compact_plate(text):
+    """Uppercase a plate and drop separators, e.g. 'mh-12-ab-1234' -> 'MH12AB1234'."""
+    return re.sub(r'[^A-Z0-9]', '', (text or '').upper())
+
+
+def fold_plate(text):
+    """Compact a plate and fold the characters OCR confuses."""
+    return compact_plate(text).translate(CONFUSIONS)
+
+
+def trigrams(key):
+    padded = f"^{key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, max_distance):
+    """Levenshtein distance of a and b, stopping early once it exceeds max_distance."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+############ Plate search over the events database #############
+class PlateSearch:
+    """
+    Exact, prefix and fuzzy plate lookups over the events table.
+
+    Distinct plates are kept in a small 'plates' table with their compact and folded forms and
+    a trigram index, refreshed incrementally from the events table before every search.
+    """
+    def __init__(self, db_path='records.db'):
+        self.conn = sqlite3.connect(db_path)
+        if self.conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='events'").fetchone() is None:
+            self.conn.close()
+            raise ValueError(f"{db_path} has no events table, run the application once to create or migrate it")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS plates (
+                plate TEXT PRIMARY KEY,
+                compact TEXT NOT NULL,
+                folded TEXT NOT NULL,
+                first_ts REAL,
+                last_ts REAL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS plates_compact ON plates (compact);
+            CREATE INDEX IF NOT EXISTS plates_folded ON plates (folded);
+            CREATE TABLE IF NOT EXISTS plate_trigrams (
+                trigram TEXT NOT NULL,
+                plate TEXT NOT NULL,
+                PRIMARY KEY (trigram, plate)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS plate_index_state (last_event_id INTEGER NOT NULL);
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def prune_index(conn, cutoff):
+        """
+        Drop the plates without events left from the plate index, and recount the plates
+        that had events older than cutoff. Called after the retention deleted those events.
+        """
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='plates'").fetchone() is None:
+            return  # plate search was never used on this database
+        orphaned = "SELECT plate FROM plates WHERE NOT EXISTS (SELECT 1 FROM events WHERE events.plate = plates.plate)"
+        with conn:
+            conn.execute(f"DELETE FROM plate_trigrams WHERE plate IN ({orphaned})")
+            conn.execute(f"DELETE FROM plates WHERE plate IN ({orphaned})")
+            conn.execute("""
+                UPDATE plates SET
+                    first_ts = (SELECT min(ts) FROM events WHERE events.plate = plates.plate),
+                    hits = (SELECT count(*) FROM events WHERE events.plate = plates.plate)
+                WHERE first_ts < ?
+            """, (cutoff,))
+
+    def refresh_index(self):
+        """Add the plates of the events stored since the last refresh to the plate index."""
+        row = self.conn.execute("SELECT last_event_id FROM plate_index_state").fetchone()
+        last_event_id = row[0] if row else 0
+        rows = self.conn.execute(
+            "SELECT id, plate, ts FROM events WHERE id > ? AND plate != '' ORDER BY id", (last_event_id,)).fetchall()
+        # A passage row gets the better plate of its track while the track lives, so rows indexed
+        # before can carry a plate the index does not know yet. Look again at the recent ones, over the
+        # ts index (the unary + keeps SQLite from scanning the rowid range instead).
+        rows += self.conn.execute("""
+            SELECT events.id, events.plate, events.ts FROM events LEFT JOIN plates ON plates.plate = events.plate
+            WHERE events.ts >= ? AND +events.id <= ? AND events.plate != '' AND plates.plate IS NULL
+        """, (time.time() - REREAD_WINDOW, last_event_id)).fetchall()
+        if not rows:
+            return
+        seen = {}
+        for event_id, plate, ts in rows:
+            first_ts, last_ts, hits = seen.get(plate, (ts, ts, 0))
+            seen[plate] = (min(first_ts, ts), max(last_ts, ts), hits + 1)
+        with self.conn:
+            for plate, (first_ts, last_ts, hits) in seen.items():
+                self.conn.execute("""
+                    INSERT INTO plates (plate, compact, folded, first_ts, last_ts, hits) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (plate) DO UPDATE SET
+                        first_ts = min(first_ts, excluded.first_ts),
+                        last_ts = max(last_ts, excluded.last_ts),
+                        hits = hits + excluded.hits
+                """, (plate, compact_plate(plate), fold_plate(plate), first_ts, last_ts, hits))
+                self.conn.executemany("INSERT OR IGNORE INTO plate_trigrams (trigram, plate) VALUES (?, ?)",
+                                      [(trigram, plate) for trigram in trigrams(fold_plate(plate))])
+            self.conn.execute("DELETE FROM plate_index_state")
+            self.conn.execute("INSERT INTO plate_index_state (last_event_id) VALUES (?)",
+                              (max(last_event_id, max(event_id for event_id, _, _ in rows)),))
+
+    def match_plates(self, query, mode='exact', max_distance=1):
+        """
+        Find the stored plates matching a query.
+        Args:
+            query (str): Plate text, separators and case are ignored.
+            mode (str): 'exact', 'prefix' or 'fuzzy'.
+            max_distance (int): Edit distance allowed by fuzzy search, on top of O/0, B/8 style confusions.
+        Returns:
+            list: Matching plates as stored in the events table.
+        """
+        self.refresh_index()
+        if mode == 'exact':
+            rows = self.conn.execute("SELECT plate FROM plates WHERE compact = ?", (compact_plate(query),))
+            return [row[0] for row in rows]
+        if mode == 'prefix':
+            prefix = compact_plate(query)
+            if not prefix:
+                return []
+            # a range scan on the compact index instead of LIKE
+            upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            rows = self.conn.execute("SELECT plate FROM plates WHERE compact >= ? AND compact < ?", (prefix, upper))
+            return [row[0] for row in rows]
+
+        key = fold_plate(query)
+        query_trigrams = trigrams(key)
+        # every edit destroys at most three trigrams of the query
+        min_shared = len(query_trigrams) - 3 * max_distance
+        if min_shared > 0:
+            placeholders = ",".join("?" * len(query_trigrams))
+            rows = self.conn.execute(f"""
+                SELECT plate, folded FROM plates WHERE plate IN (
+                    SELECT plate FROM plate_trigrams WHERE trigram IN ({placeholders})
+                    GROUP BY plate HAVING count(*) >= ?
+                )
+            """, (*query_trigrams, min_shared))
+        else:
+            rows = self.conn.execute("SELECT plate, folded FROM plates")
+        return [plate for plate, folded in rows if edit_distance(key, folded, max_distance) <= max_distance]
+
+    def search(self, query, mode='exact', max_distance=1, camera=None, since=None, until=None, limit=100):
+        """
+        Return the events of the plates matching a query, newest first.
+        Args:
+            since (float): Epoch seconds of the oldest event, None for no limit.
+            until (float): Epoch seconds of the newest event, None for no limit.
+        Returns:
+            list: (camera, ts, track_id, class, plate, confidence) tuples.
+        """
+        plates = self.match_plates(query, mode, max_distance)
+        if not plates:
+            return []
+        sql = f"""
+            SELECT camera, ts, track_id, class, plate, confidence FROM events
+            WHERE plate IN ({",".join("?" * len(plates))})
+        """
+        params = list(plates)
+        sql, params = self.add_filters(sql, params, camera, since, until)
+        sql += " ORDER BY ts DESC LIMIT ?"
+        return self.conn.execute(sql, (*params, limit)).fetchall()
+
+    def camera_stats(self, since=None, until=None):
+        """
+        Aggregate the events of every camera.
+        Returns:
+            list: (camera, events, distinct plates, first ts, last ts) tuples.
+        """
+        sql, params = self.add_filters("""
+            SELECT camera, count(*), count(DISTINCT nullif(plate, '')), min(ts), max(ts) FROM events WHERE 1
+        """, [], None, since, until)
+        return self.conn.execute(sql + " GROUP BY camera ORDER BY camera", params).fetchall()
+
+    @staticmethod
+    def add_filters(sql, params, camera, since, until):
+        if camera is not None:
+            sql += " AND camera = ?"
+            params.append(camera)
+        if since is not None:
+            sql += " AND ts >= ?"
+            params.append(since)
+        if until is not None:
+            sql += " AND ts <= ?"
+            params.append(until)
+        return sql, params
+
+
+def parse_time(value):
+    """Parse an ISO date or datetime given on the command line into epoch seconds."""
+    return datetime.datetime.fromisoformat(value).timestamp() if value else None
+
+
+def format_time(ts):
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search recorded license plates.")
+    parser.add_argument('plate', nargs='?', help="plate to look up, separators and case are ignored")
+    parser.add_argument('--mode', choices=['exact', 'prefix', 'fuzzy'], default='exact')
+    parser.add_argument('--distance', type=int, default=1, help="edit distance allowed by fuzzy search")
+    parser.add_argument('--camera', help="only events of this camera")
+    parser.add_argument('--since', help="oldest event, e.g. 2024-11-01 or 2024-11-01T08:00")
+    parser.add_argument('--until', help="newest event")
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--stats', action='store_true', help="print per camera aggregates")
+    parser.add_argument('--db', default='records.db')
+    args = parser.parse_args()
+
+    try:
+        search = PlateSearch(args.db)
+    except ValueError as e:
+        sys.exit(f"plateSearch error: {e}")
+    since, until = parse_time(args.since), parse_time(args.until)
+    try:
+        if args.stats:
+            for camera, events, plates, first_ts, last_ts in search.camera_stats(since, until):
+                print(f"{camera}: {events} events, {plates} plates, {format_time(first_ts)} .. {format_time(last_ts)}")
+        if args.plate:
+            for camera, ts, track_id, object_type, plate, confidence in search.search(
+                    args.plate, args.mode, args.distance, args.camera, since, until, args.limit):
+                print(f"{format_time(ts)}  {camera}  {plate}  {object_type}  track {track_id}")
+        elif not args.stats:
+            parser.print_help()
+    finally:
+        search.close()
+
+
+if __name__ == "__main__":
+    main()
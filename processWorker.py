@@ -0,0 +1,167 @@
+import multiprocessing
+import queue
+import threading
+import time
+
+import cv2
+
+from displayStream import FrameEncoder
+from eventStore import RecentEvents
+from frameBuffers import LatestFrameSlot, FrameChannel
+from motionDetector import make_motion_detector
+from samplingPolicy import make_sampling_policy
+from sharedFrames import SharedFrameRing, release_frame
+from videoSource import CaptureThread, open_capture
+
+
+def run_camera_worker(cam_name, cam_details, source, messages, stop_event):
+    """
+    Entry point of a camera worker process.
+
+    Capture, detection, OCR, recording and the downscaling and drawing of display frames all run
+    here, away from the GIL of the UI process. Display frames are written to a shared memory ring,
+    only small messages go through the queue: ('ready', (ring name, shape, slots)),
+    ('events', latest events), ('error', text) and finally ('stopped', None).
+    """
+    from cameraWindow import WindowStreamer  # imported here, cameraWindow imports this module
+
+    ring = None
+    caps = []  # opened captures not yet handed to a CaptureThread, which releases them itself
+    capture_threads = []
+    try:
+        streamer = WindowStreamer(cam_name, cam_details)  # loads the models in this process
+        model = streamer.model
+        capture_options = cam_details.get('capture', {})
+        cap = open_capture(source, capture_options)
+        if not cap.isOpened():
+            messages.put(('error', f"Failed to open video source: {source}"))
+            return
+        caps.append(cap)
+        sub_cap = None
+        if capture_options.get('substream'):
+            sub_cap = open_capture(capture_options['substream'], capture_options)
+            if sub_cap.isOpened():
+                caps.append(sub_cap)
+            else:
+                print(f"Failed to open substream: {capture_options['substream']}, detecting on the main stream")
+                sub_cap = None
+
+        process_slot = LatestFrameSlot()
+        sampling_policy = make_sampling_policy(cam_details.get('sampling'))
+        motion_detector = make_motion_detector(cam_details.get('motion'))
+        source_fps = cap.get(cv2.CAP_PROP_FPS) if cam_details.get('type') == 'video' else 0
+        frame_period = 1.0 / source_fps if source_fps > 0 else 0
+        channel = FrameChannel()
+        last_processed_result = {"frameDict": None}
+        recent_events = RecentEvents.get(cam_name)
+        recent_events.seed(streamer._fetch_latest_records())
+
+        threading.Thread(target=streamer.process_frames,
+                         args=(process_slot, stop_event, model, cam_name, last_processed_result,
+                               sampling_policy, motion_detector),
+                         daemon=True).start()
+        ring_slots = capture_options.get('ring_slots', 8)
+        if sub_cap is None:
+            capture_threads.append(CaptureThread(cap, stop_event, channel, process_slot, sampling_policy,
+                                                 frame_period, ring_slots=ring_slots).start())
+        else:
+            capture_threads.append(CaptureThread(cap, stop_event, channel, None, None, frame_period,
+                                                 ring_slots=ring_slots).start())
+            capture_threads.append(CaptureThread(sub_cap, stop_event, None, process_slot, sampling_policy,
+                                                 main_channel=channel).start())
+        caps.clear()
+
+        display_config = cam_details.get('display', {})
+        encoder = FrameEncoder(display_config.get('width', 720), display_config.get('height', 480))
+        display_interval = 1.0 / display_config.get('max_fps', 15)
+        next_display_time = time.monotonic()
+        sequence, events_version = 0, None
+        while not stop_event.is_set():
+            delay = next_display_time - time.monotonic()
+            if delay > 0 and stop_event.wait(delay):
+                break
+            next_display_time = max(next_display_time + display_interval, time.monotonic())
+
+            newer = channel.wait_newer(sequence, timeout=0.5)
+            if newer is not None:
+                sequence, frame_dict = newer
+                image, scale = encoder.resize(frame_dict['frame'])  # overlays go on this small copy
+                release_frame(frame_dict)
+                processed_frame_dict = last_processed_result.get("frameDict")
+                if processed_frame_dict is not None:
+                    image = model.plot_bounding_boxes(image, processed_frame_dict, cam_name, scale)
+                if ring is None:
+                    ring = SharedFrameRing.create(image.shape, display_config.get('ring_slots', 4))
+                    messages.put(('ready', (ring.name, image.shape, ring.slots)))
+                if image.shape == ring.shape:
+                    ring.write(image)
+
+            version, records = recent_events.snapshot()
+            if version != events_version:
+                events_version = version
+                messages.put(('events', records))
+    except Exception as e:
+        messages.put(('error', f"Camera worker {cam_name} error: {e}"))
+    finally:
+        stop_event.set()
+        for cap in caps:
+            cap.release()
+        for capture_thread in capture_threads:
+            capture_thread.thread.join(timeout=2)  # let them release their captures before the process exits
+        if ring is not None:
+            ring.close()
+        messages.put(('stopped', None))
+
+
+############ Camera worker process #############################
+class CameraWorker:
+    """
+    Runs the whole pipeline of one camera in a spawned process, see run_camera_worker.
+
+    The UI process keeps a thread reading the worker's messages: it attaches the display ring
+    and pushes the latest events into the camera's RecentEvents buffer.
+    """
+    def __init__(self, cam_name, cam_details, source):
+        context = multiprocessing.get_context('spawn')  # no forked copies of the UI process and its threads
+        self.cam_name = cam_name
+        self.messages = context.Queue()
+        self.stop_event = context.Event()
+        self.process = context.Process(target=run_camera_worker, daemon=True,
+                                       args=(cam_name, cam_details, source, self.messages, self.stop_event))
+        self.ring = None
+        self.stopped = threading.Event()  # set once the worker ended, e.g. at the end of a video
+
+    def start(self):
+        self.process.start()
+        threading.Thread(target=self.receive, daemon=True).start()
+        return self
+
+    def receive(self):
+        while True:
+            try:
+                kind, payload = self.messages.get(timeout=0.5)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    break
+                continue
+            if kind == 'ready':
+                self.ring = SharedFrameRing.attach(*payload)
+            elif kind == 'events':
+                RecentEvents.get(self.cam_name).replace(payload)
+            elif kind == 'error':
+                print(payload)
+            elif kind == 'stopped':
+                break
+        self.stopped.set()
+
+    def read_frame(self, last_sequence, out=None):
+        """Newest display frame of the worker, see SharedFrameRing.read_latest."""
+        if self.ring is None:
+            return None
+        return self.ring.read_latest(last_sequence, out)
+
+    def stop(self):
+        self.stop_event.set()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
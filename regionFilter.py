@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+
+
+############ Region of interest ################################
+class InferenceRegion:
+    """Polygon region of interest of a camera. The detector only sees its bounding rectangle."""
+    def __init__(self, polygon):
+        self.polygon = np.asarray(polygon, dtype=np.int32).reshape(-1, 2)
+        x, y, w, h = cv2.boundingRect(self.polygon)
+        self.rect = (x, y, x + w, y + h)
+
+    def crop(self, frame, scale=(1.0, 1.0)):
+        """
+        Crop the bounding rectangle of the region.
+        Args:
+            scale (tuple): (x, y) size of frame relative to the frame the polygon was drawn on, e.g. a substream.
+        Returns:
+            tuple: (crop, (x_offset, y_offset)) to map boxes of the crop back to the frame.
+        """
+        h, w = frame.shape[:2]
+        x1, y1, x2, y2 = self.rect
+        x1, x2 = int(x1 * scale[0]), int(x2 * scale[0])
+        y1, y2 = int(y1 * scale[1]), int(y2 * scale[1])
+        x1, y1 = min(max(x1, 0), w - 1), min(max(y1, 0), h - 1)
+        x2, y2 = min(max(x2, x1 + 1), w), min(max(y2, y1 + 1), h)
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def contains_boxes(self, boxes):
+        """Mask of the boxes whose centre lies inside the polygon."""
+        centres = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+        return np.array([cv2.pointPolygonTest(self.polygon, (float(x), float(y)), False) >= 0
+                         for x, y in centres], dtype=bool)
+
+
+############ Trigger line ######################################
+class TriggerLine:
+    """Virtual line segment. A track is armed for plate OCR once its centre crosses it."""
+    def __init__(self, points):
+        (x1, y1), (x2, y2) = points
+        self.start = (float(x1), float(y1))
+        self.end = (float(x2), float(y2))
+        self.last_centres = {}
+        self.crossed = set()
+
+    @staticmethod
+    def orientation(a, b, c):
+        value = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+        return (value > 0) - (value < 0)
+
+    def intersects(self, p, q):
+        """Check if the segment p-q crosses the line segment."""
+        a, b = self.start, self.end
+        return (self.orientation(a, b, p) != self.orientation(a, b, q)
+                and self.orientation(p, q, a) != self.orientation(p, q, b))
+
+    def update(self, detected_objects, active_track_ids):
+        """Follow the centre of every tracked object and arm the ones that crossed the line."""
+        for obj in detected_objects:
+            track_id = obj['trackID']
+            if track_id == "":
+                continue
+            x1, y1, x2, y2 = obj['obj_bbox']
+            centre = ((x1 + x2) / 2, (y1 + y2) / 2)
+            previous = self.last_centres.get(track_id)
+            if previous is not None and self.intersects(previous, centre):
+                self.crossed.add(track_id)
+            self.last_centres[track_id] = centre
+        # forget tracks dropped by the tracker
+        self.last_centres = {track_id: c for track_id, c in self.last_centres.items() if track_id in active_track_ids}
+        self.crossed &= active_track_ids
+
+    def has_crossed(self, track_id):
+        return track_id in self.crossed
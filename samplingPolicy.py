@@ -0,0 +1,99 @@
+import math
+import time
+from motionDetector import MotionDetector
+
+
+############ Frame sampling policies ###########################
+class SamplingPolicy:
+    """Decides which captured frames of a camera are sent to inference, adapting to the measured latency."""
+    def __init__(self):
+        self.latency = None         # moving average of the inference time in seconds
+        self.frame_interval = None  # moving average of the time between captured frames
+        self.last_frame_time = None
+        self.last_sample_time = 0.0
+
+    @staticmethod
+    def average(current, value, alpha=0.2):
+        return value if current is None else (1 - alpha) * current + alpha * value
+
+    def record_latency(self, seconds):
+        """Called by the processing thread with the time one frame took."""
+        self.latency = self.average(self.latency, seconds)
+
+    def should_sample(self, frame):
+        """Check if this captured frame should be sent to inference."""
+        now = time.monotonic()
+        if self.last_frame_time is not None:
+            self.frame_interval = self.average(self.frame_interval, now - self.last_frame_time)
+        self.last_frame_time = now
+        if self.decide(frame, now):
+            self.last_sample_time = now
+            return True
+        return False
+
+    def decide(self, frame, now):
+        raise NotImplementedError("Decide method should be implemented by the specific policy subclass!!!")
+
+
+class FixedStridePolicy(SamplingPolicy):
+    """Sends every n-th frame, widening the stride while inference is slower than n frames."""
+    def __init__(self, stride=2):
+        super().__init__()
+        self.stride = max(int(stride), 1)
+        self.count = 0
+
+    def decide(self, frame, now):
+        stride = self.stride
+        if self.latency is not None and self.frame_interval:
+            stride = max(stride, math.ceil(self.latency / self.frame_interval))
+        self.count += 1
+        if self.count >= stride:
+            self.count = 0
+            return True
+        return False
+
+
+class TargetFpsPolicy(SamplingPolicy):
+    """Sends frames at a target rate, or as fast as inference keeps up if that is slower."""
+    def __init__(self, target_fps=5):
+        super().__init__()
+        self.min_interval = 1.0 / target_fps
+
+    def decide(self, frame, now):
+        interval = max(self.min_interval, self.latency or 0.0)
+        return now - self.last_sample_time >= interval
+
+
+class MotionTriggeredPolicy(SamplingPolicy):
+    """Sends frames with motion, plus one every idle_interval seconds to keep tracks alive."""
+    def __init__(self, motion_detector, max_fps=10, idle_interval=2.0):
+        super().__init__()
+        self.motion_detector = motion_detector
+        self.min_interval = 1.0 / max_fps
+        self.idle_interval = idle_interval
+
+    def decide(self, frame, now):
+        elapsed = now - self.last_sample_time
+        if elapsed < max(self.min_interval, self.latency or 0.0):
+            return False
+        return self.motion_detector.detect(frame) or elapsed >= self.idle_interval
+
+
+def make_sampling_policy(config):
+    """
+    Build the sampling policy of a camera from the 'sampling' section of its config.
+    Args:
+        config (dict): e.g. {'mode': 'fps', 'target_fps': 8}. Modes are 'stride' (default), 'fps' and 'motion'.
+    Returns:
+        SamplingPolicy: The policy.
+    """
+    config = config or {}
+    mode = config.get('mode', 'stride')
+    if mode == 'fps':
+        return TargetFpsPolicy(target_fps=config.get('target_fps', 5))
+    elif mode == 'motion':
+        motion_detector = MotionDetector(method=config.get('method', 'diff'), roi=config.get('roi'),
+                                         min_area=config.get('min_area', 0.002))
+        return MotionTriggeredPolicy(motion_detector, max_fps=config.get('max_fps', 10),
+                                     idle_interval=config.get('idle_interval', 2.0))
+    return FixedStridePolicy(stride=config.get('stride', 2))
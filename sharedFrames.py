@@ -0,0 +1,174 @@
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+############ Shared memory frame ring ##########################
+class SharedFrameRing:
+    """
+    Fixed-size ring of frame slots in shared memory, written by one process and read by others.
+
+    The header holds the sequence number of the newest frame and of every slot. A writer marks
+    a slot -1 while copying into it, readers check the slot sequence before and after reading,
+    so a frame overwritten during a read is never returned. Nothing is pickled, only the ring
+    name, frame shape and slot count are sent to the readers once.
+    """
+    def __init__(self, shm, shape, slots, owner):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.owner = owner  # the creating process unlinks the memory
+        header_size = 8 * (1 + slots)
+        offset = (header_size + 63) // 64 * 64
+        self.header = np.ndarray((1 + slots,), dtype=np.int64, buffer=shm.buf)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+
+    @staticmethod
+    def size(shape, slots):
+        return (8 * (1 + slots) + 63) // 64 * 64 + slots * int(np.prod(shape))
+
+    @classmethod
+    def create(cls, shape, slots=4):
+        """Allocate a ring for frames of one shape (uint8, e.g. (h, w, 3))."""
+        shm = shared_memory.SharedMemory(create=True, size=cls.size(shape, slots))
+        ring = cls(shm, shape, slots, owner=True)
+        ring.header[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name, shape, slots=4):
+        """Open a ring created by another process."""
+        # Spawned workers share the resource tracker of the UI process, so the ring is unlinked once
+        return cls(shared_memory.SharedMemory(name=name), shape, slots, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, frame):
+        """
+        Copy a frame into the next slot.
+        Returns:
+            int: Sequence number of the frame.
+        """
+        sequence = int(self.header[0]) + 1
+        slot = sequence % self.slots
+        self.header[1 + slot] = -1
+        np.copyto(self.frames[slot], frame)
+        self.header[1 + slot] = sequence
+        self.header[0] = sequence
+        return sequence
+
+    def read_latest(self, last_sequence, out=None):
+        """
+        Copy the newest frame if it is newer than last_sequence.
+        Args:
+            out (numpy.ndarray): Buffer of the frame shape to copy into, allocated if None.
+        Returns:
+            tuple: (sequence, frame), or None if there is no newer frame.
+        """
+        for _ in range(3):
+            sequence = int(self.header[0])
+            if sequence == 0 or sequence == last_sequence:
+                return None
+            slot = sequence % self.slots
+            if self.header[1 + slot] != sequence:
+                continue  # overwritten since the header was read
+            if out is None:
+                out = np.empty(self.shape, dtype=np.uint8)
+            np.copyto(out, self.frames[slot])
+            if self.header[1 + slot] == sequence:
+                return sequence, out
+        return None
+
+    def close(self):
+        # The numpy views have to go before the mapping can be closed
+        del self.header, self.frames
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+############ Reference counted capture slots ###################
+class FrameHandle:
+    """One slot of a FrameRing. The slot is not reused while references to it are held."""
+    __slots__ = ('ring', 'index', 'array')
+
+    def __init__(self, ring, index, array):
+        self.ring = ring
+        self.index = index
+        self.array = array
+
+    def retain(self):
+        self.ring.retain(self.index)
+
+    def release(self):
+        self.ring.release(self.index)
+
+
+class FrameRing:
+    """
+    Preallocated frame slots of one camera in shared memory, handed out as reference counted handles.
+
+    Capture decodes straight into a free slot and every stage (display, detection, OCR) reads that
+    same buffer. Whoever hands a frame on retains it for the receiver and releases its own reference,
+    a slot is written again only once its count dropped to zero.
+    """
+    def __init__(self, shape, slots=8):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * int(np.prod(self.shape)))
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.refcounts = [0] * slots
+        self.lock = threading.Lock()
+        self.next_index = 0
+        self.exhausted = 0  # claims that found every slot held
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def claim(self):
+        """
+        Take a free slot to write a frame into.
+        Returns:
+            FrameHandle: Handle holding one reference for the caller, None if every slot is held.
+        """
+        with self.lock:
+            for offset in range(self.slots):
+                index = (self.next_index + offset) % self.slots
+                if self.refcounts[index] == 0:
+                    self.refcounts[index] = 1
+                    self.next_index = index + 1
+                    return FrameHandle(self, index, self.frames[index])
+            self.exhausted += 1
+            return None
+
+    def retain(self, index):
+        with self.lock:
+            self.refcounts[index] += 1
+
+    def release(self, index):
+        with self.lock:
+            if self.refcounts[index] <= 0:
+                raise RuntimeError(f"Frame slot {index} released more often than retained")
+            self.refcounts[index] -= 1
+
+    def close(self):
+        """Remove the shared memory name, the mapping goes away with the last frame still in use."""
+        self.shm.unlink()
+
+
+def retain_frame(frame_dict):
+    """Take a reference on the ring slot of a frame dictionary, frames without one are ordinary arrays."""
+    handle = frame_dict.get('handle') if frame_dict is not None else None
+    if handle is not None:
+        handle.retain()
+
+
+def release_frame(frame_dict):
+    """Give back a reference taken with retain_frame or received from a frame buffer."""
+    handle = frame_dict.get('handle') if frame_dict is not None else None
+    if handle is not None:
+        handle.release()
@@ -0,0 +1,166 @@
+import re
+import cv2
+
+# Characters OCR confuses between letters and digits, used to fix a read by plate position
+TO_DIGIT = {'O': '0', 'D': '0', 'Q': '0', 'I': '1', 'L': '1', 'Z': '2', 'S': '5', 'G': '6', 'T': '7', 'B': '8'}
+TO_LETTER = {'0': 'O', '1': 'I', '2': 'Z', '5': 'S', '6': 'G', '7': 'T', '8': 'B'}
+# Letter (A) and digit (9) positions of a 10 character standard plate, e.g. MH12AB1234
+STANDARD_LAYOUT = 'AA99AA9999'
+
+
+############ Multi-frame plate text voting #####################
+class PlateVote:
+    """Character-position vote over the OCR reads of one tracked vehicle."""
+    def __init__(self, min_reads=2, min_confidence=0.6, prior=1.0):
+        self.min_reads = min_reads            # reads that must agree in length before a plate is emitted
+        self.min_confidence = min_confidence  # weakest position confidence needed to emit a plate
+        self.prior = prior                    # pseudo-weight keeping a single read from looking certain
+        self.votes = {}                       # length -> list of {char: weight} per position
+        self.reads = {}                       # length -> number of reads
+
+    @staticmethod
+    def normalize(text):
+        """Uppercase a read, drop separators and fix letter/digit confusions of standard plates."""
+        text = re.sub(r'[^A-Z0-9]', '', text.upper())
+        if len(text) != len(STANDARD_LAYOUT):
+            return text
+        return "".join(TO_LETTER.get(char, char) if kind == 'A' else TO_DIGIT.get(char, char)
+                       for char, kind in zip(text, STANDARD_LAYOUT))
+
+    def add_read(self, text, confidence, char_confidences=None):
+        """
+        Add one OCR read to the vote.
+        Args:
+            text (str): Raw OCR text.
+            confidence (float): Confidence of the whole read.
+            char_confidences (list): Optional confidence of every character, defaults to the read confidence.
+        """
+        text = self.normalize(text)
+        if not text:
+            return
+        if char_confidences is None or len(char_confidences) != len(text):
+            char_confidences = [confidence] * len(text)
+        positions = self.votes.setdefault(len(text), [{} for _ in text])
+        for position, char, weight in zip(positions, text, char_confidences):
+            position[char] = position.get(char, 0.0) + float(weight)
+        self.reads[len(text)] = self.reads.get(len(text), 0) + 1
+
+    def result(self):
+        """
+        Compute the consensus of the reads so far.
+        Returns:
+            tuple: (text, confidence), text is empty until the consensus is confident enough.
+        """
+        if not self.votes:
+            return '', 0.0
+        # Vote among the reads of the most supported length
+        length = max(self.votes, key=lambda n: sum(sum(position.values()) for position in self.votes[n]))
+        text = ''
+        confidence = 1.0
+        for position in self.votes[length]:
+            char, weight = max(position.items(), key=lambda item: item[1])
+            text += char
+            confidence = min(confidence, weight / (sum(position.values()) + self.prior))
+        if self.reads[length] < self.min_reads or confidence < self.min_confidence:
+            return '', confidence
+        return text, confidence
+
+
+############ Track level OCR cache #############################
+class PlateTrackCache:
+    """Keeps the voted plate reading of every tracked vehicle so it is not OCR'd on every frame."""
+    def __init__(self, formatter, stable_frames=3, min_reads=2, min_confidence=0.6, quality_gain=1.25):
+        self.formatter = formatter            # turns a consensus into a valid plate or an empty string
+        self.stable_frames = stable_frames    # frames the consensus must hold before OCR is skipped
+        self.min_reads = min_reads
+        self.min_confidence = min_confidence
+        self.quality_gain = quality_gain      # a settled track is re-read only if its crop is this much better
+        self.entries = {}
+
+    @staticmethod
+    def crop_quality(crop):
+        """
+        Score a vehicle crop by its size and sharpness.
+        Args:
+            crop (numpy.ndarray): Vehicle crop.
+        Returns:
+            float: Crop area weighted by a saturating Laplacian variance sharpness term.
+        """
+        h, w = crop.shape[:2]
+        if h == 0 or w == 0:
+            return 0.0
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        # Measure sharpness on a small copy, the score only has to be comparable between frames
+        scale = min(1.0, 128 / max(h, w))
+        if scale < 1.0:
+            gray = cv2.resize(gray, (max(int(w * scale), 1), max(int(h * scale), 1)), interpolation=cv2.INTER_AREA)
+        sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+        return float(h * w) * sharpness / (sharpness + 100.0)
+
+    def is_settled(self, track_id):
+        """Check if a track already has a confident reading that was stable for enough frames."""
+        entry = self.entries.get(track_id)
+        return entry is not None and entry['stable_count'] >= self.stable_frames
+
+    def score(self, track_id):
+        """
+        Rank the current reading of a track against earlier ones.
+        Returns:
+            tuple: (settled, vote confidence), None if the track has no entry.
+        """
+        entry = self.entries.get(track_id)
+        if entry is None:
+            return None
+        return int(self.is_settled(track_id)), entry['confidence']
+
+    def needs_read(self, track_id, quality):
+        """Check if plate detection and OCR have to run for a track on this frame."""
+        if track_id == "" or not self.is_settled(track_id):
+            return True
+        return quality > self.entries[track_id]['quality'] * self.quality_gain
+
+    def cached_plates(self, track_id):
+        """Return a copy of the plates stored for a track."""
+        entry = self.entries.get(track_id)
+        if entry is None:
+            return []
+        return [dict(plate) for plate in entry['plates']]
+
+    def update(self, track_id, plates, quality):
+        """
+        Vote with the plates read for a track on this frame.
+        Args:
+            track_id (int): SORT track id of the vehicle.
+            plates (list): Plate dicts with 'plate_bbox', 'raw_text' and 'ocr_conf'.
+            quality (float): Quality of the vehicle crop the plates were read from.
+        Returns:
+            str: The formatted consensus plate of the track, empty until it is confident.
+        """
+        if track_id == "":
+            return ''
+        entry = self.entries.setdefault(track_id, {'vote': PlateVote(self.min_reads, self.min_confidence),
+                                                   'plates': [], 'text': '', 'confidence': 0.0,
+                                                   'stable_count': 0, 'quality': 0.0})
+        readable = [plate for plate in plates if plate['raw_text'] != '']
+        if not readable:
+            return entry['text']
+        best = max(readable, key=lambda plate: plate['ocr_conf'])
+        entry['vote'].add_read(best['raw_text'], best['ocr_conf'])
+
+        consensus, confidence = entry['vote'].result()
+        text = self.formatter(consensus) if consensus else ''
+        if text == '':
+            return entry['text']
+        if text == entry['text']:
+            entry['stable_count'] += 1
+        else:
+            entry.update(text=text, stable_count=1)
+        entry['confidence'] = confidence
+        if quality >= entry['quality'] or not entry['plates']:
+            entry.update(plates=[dict(best, text=text, ocr_conf=confidence)], quality=quality)
+        return text
+
+    def evict(self, active_track_ids):
+        """Drop the entries of tracks that SORT no longer keeps."""
+        for track_id in [track_id for track_id in self.entries if track_id not in active_track_ids]:
+            del self.entries[track_id]
@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from sharedFrames import FrameRing, release_frame
+
+_open_lock = threading.Lock()  # OPENCV_FFMPEG_CAPTURE_OPTIONS is process wide, set it around one open at a time
+
+
+def ffmpeg_options(options):
+    """
+    FFmpeg demuxer flags of a camera's capture options.
+
+    OpenCV hands OPENCV_FFMPEG_CAPTURE_OPTIONS to the demuxer only, decoder options in it are ignored.
+    Args:
+        options (dict): 'transport' ('tcp' or 'udp') and 'low_delay' (bool).
+    Returns:
+        str: The flags in the OPENCV_FFMPEG_CAPTURE_OPTIONS format, e.g. 'rtsp_transport;tcp|fflags;nobuffer'.
+    """
+    flags = []
+    if options.get('transport'):
+        flags.append(f"rtsp_transport;{options['transport']}")
+    if options.get('low_delay', False):
+        flags.extend(["fflags;nobuffer", "max_delay;0"])
+    return "|".join(flags)
+
+
+def open_capture(source, options=None):
+    """
+    Open a video source with the capture options of a camera.
+    Args:
+        source: Webcam index, file path or stream URL.
+        options (dict): FFmpeg flags as in ffmpeg_options, plus 'hw_accel' (bool) to decode on the GPU when
+            available and 'threads' (int) for the number of decoder threads.
+    Returns:
+        cv2.VideoCapture: The capture, check isOpened().
+    """
+    options = options or {}
+    if isinstance(source, int):
+        cap = cv2.VideoCapture(source)  # webcams do not go through FFmpeg
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # no frames queued up in the V4L2/DirectShow driver
+        return cap
+    params = []
+    if options.get('hw_accel', False):
+        params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+    if options.get('threads'):
+        params += [cv2.CAP_PROP_N_THREADS, int(options['threads'])]  # decoder options, unlike the env flags
+    flags = ffmpeg_options(options)
+    with _open_lock:
+        previous = os.environ.get('OPENCV_FFMPEG_CAPTURE_OPTIONS')
+        if flags:
+            os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = flags
+        try:
+            cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG, params)
+        finally:
+            if previous is None:
+                os.environ.pop('OPENCV_FFMPEG_CAPTURE_OPTIONS', None)
+            else:
+                os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = previous
+    return cap
+
+
+############ Capture thread ####################################
+class CaptureThread:
+    """
+    Reads a source on its own thread so slow consumers never back-pressure cap.read().
+
+    Every decoded frame replaces the previous one in the display channel, and the frames chosen
+    by the sampling policy replace the one waiting in the processing slot. Nothing queues up,
+    so live streams stay real-time however slow display or inference get.
+
+    Frames are decoded straight into the slots of a FrameRing sized on the first frame, and
+    display, detection and OCR all read that buffer. frame_dict['handle'] is the slot reference.
+
+    A substream capture passes main_channel instead of a display channel: its frames become the
+    'infer_frame' the detector runs on, paired with the newest full resolution 'frame' of the
+    main stream that plates are cropped from.
+
+    The thread owns its capture and releases it when it stops, callers only set stop_event.
+    """
+    def __init__(self, cap, stop_event, channel, process_slot, sampling_policy, frame_period=0, main_channel=None,
+                 ring_slots=8):
+        self.cap = cap
+        self.stop_event = stop_event
+        self.channel = channel
+        self.process_slot = process_slot
+        self.sampling_policy = sampling_policy
+        self.frame_period = frame_period  # set for video files, which are played at their own frame rate
+        self.main_channel = main_channel
+        self.ring_slots = ring_slots if main_channel is None else 0  # small substream frames are not pooled
+        self.ring = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def read(self):
+        """
+        Decode the next frame, into a free ring slot when there is one.
+        Returns:
+            tuple: (ret, frame, handle) where handle is the slot holding frame, or None.
+        """
+        handle = self.ring.claim() if self.ring is not None else None
+        if handle is None:
+            ret, frame = self.cap.read()
+        else:
+            ret, frame = self.cap.read(handle.array)
+            if not ret or not np.may_share_memory(frame, handle.array):
+                # the decoder allocated a frame of its own, e.g. after a resolution change
+                handle.release()
+                handle = None
+        if ret and self.ring is None and self.ring_slots:
+            self.ring = FrameRing(frame.shape, self.ring_slots)
+        return ret, frame, handle
+
+    def run(self):
+        frame_num = 0
+        next_frame_time = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                ret, frame, handle = self.read()
+                if not ret:
+                    print("Cannot connect to source!")
+                    self.stop_event.set()
+                    break
+
+                frame_num += 1
+                if self.main_channel is not None:
+                    main = self.main_channel.latest()
+                    if main is None:
+                        continue  # the main stream has no frame yet
+                    # the reference latest() took on the main frame moves into the new dictionary
+                    frame_dict = {'frameNum': frame_num, 'frame': main['frame'], 'infer_frame': frame,
+                                  'handle': main.get('handle')}
+                else:
+                    frame_dict = {'frameNum': frame_num, 'frame': frame, 'handle': handle}
+                if self.channel is not None:
+                    self.channel.publish(frame_dict)
+                # Send the frames chosen by the sampling policy, replacing a frame not picked up yet
+                if self.process_slot is not None and self.sampling_policy.should_sample(frame):
+                    self.process_slot.put(frame_dict)
+                release_frame(frame_dict)  # the channel and the slot hold their own references
+
+                if self.frame_period:  # pace video files to their frame rate
+                    next_frame_time += self.frame_period
+                    delay = next_frame_time - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_frame_time = time.monotonic()
+        except Exception as e:
+            print(f"Error reading frame: {e}")
+            self.stop_event.set()
+        finally:
+            # Released here, never by another thread while cap.read() may still be decoding into the ring
+            self.cap.release()
+            if self.channel is not None:
+                self.channel.close()
+            if self.ring is not None:
+                self.ring.close()